@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark of the peakdetect detectors.
+
+Every detector is run on the waveforms of the 'waveform' module at signal
+sizes from 10**3 to 10**8 samples. The wall time, samples/s and peaks/s of
+every run are written to a JSON file, which can be compared against a
+baseline saved by an earlier run:
+
+$ python benchmark.py --output new.json --baseline old.json
+
+Runs are flagged as regressions when they are slower than the baseline by
+more than --threshold, and the exit status is then 1.
+
+With --imports the time to import peakdetect in a fresh interpreter is
+measured instead, and compared with that of numpy, which it needs anyway:
+
+$ python benchmark.py --imports
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import scipy
+
+import peakdetect
+import waveform
+
+
+# the sample rate and frequency of the test signals in 'test.py'
+SAMPLE_RATE = 10000
+HZ = 50
+SAMPLES_PER_PERIOD = SAMPLE_RATE // HZ
+
+# signals are generated in chunks of this many samples, which bounds the
+# temporary memory of the waveform generators
+GENERATE_CHUNK = 1 << 20
+
+
+def _uniform(func, **kwargs):
+    """
+    Runs a detector with the uniform x axis of the benchmark signals
+    """
+    def run(y):
+        return func(y, sample_rate=SAMPLE_RATE, output="array", **kwargs)
+    return run
+
+
+# name, detector and the largest signal it is run on, which keeps the
+# detectors that interpolate the whole signal within memory
+DETECTORS = [
+    ("peakdetect", _uniform(peakdetect.peakdetect,
+                            lookahead=SAMPLES_PER_PERIOD // 4), 10**8),
+    ("peakdetect_zero_crossing",
+     _uniform(peakdetect.peakdetect_zero_crossing), 10**8),
+    ("peakdetect_parabola", _uniform(peakdetect.peakdetect_parabola), 10**8),
+    ("peakdetect_sine", _uniform(peakdetect.peakdetect_sine), 10**8),
+    ("peakdetect_sine_locked",
+     _uniform(peakdetect.peakdetect_sine_locked), 10**8),
+    ("peakdetect_fft", _uniform(peakdetect.peakdetect_fft), 10**6),
+    ("peakdetect_fft_local",
+     _uniform(peakdetect.peakdetect_fft, mode="local"), 10**8),
+    ("peakdetect_spline", _uniform(peakdetect.peakdetect_spline), 10**6),
+    ("peakdetect_spline_analytic",
+     _uniform(peakdetect.peakdetect_spline, mode="analytic"), 10**8),
+    ("zero_crossings_sine_fit",
+     lambda y: peakdetect.zero_crossings_sine_fit(
+         y, sample_rate=SAMPLE_RATE), 10**8)
+    ]
+
+WAVEFORMS = ["ACV_A{0}".format(i) for i in range(1, 9)]
+
+# the modules timed by --imports, the first one is the reference
+IMPORTS = ["numpy", "peakdetect"]
+
+
+def generate(name, size, cache=None):
+    """
+    Generates 'size' samples of one of the waveforms of the 'waveform'
+    module at SAMPLE_RATE, reading them from the .npy files in the 'cache'
+    directory when generated before
+    """
+    y = np.empty(size)
+    start = 0
+    for block in waveform.iter_waveform(name, size, SAMPLE_RATE,
+                                        GENERATE_CHUNK, HZ, cache):
+        y[start:start + len(block)] = block
+        start += len(block)
+    return y
+
+
+def count_peaks(result):
+    """
+    return: the amount of peaks, or zero crossings, found by a detector
+    """
+    if len(result) == 2 and not np.isscalar(result[0]):
+        return len(result[0]) + len(result[1])
+    return len(result)
+
+
+def measure(func, y, min_time):
+    """
+    Runs func(y) repeatedly for at least min_time seconds, at least once
+
+    return: (best wall time, mean wall time, repeats, result)
+    """
+    times = []
+    while True:
+        start = time.perf_counter()
+        result = func(y)
+        times.append(time.perf_counter() - start)
+        if sum(times) >= min_time:
+            return min(times), sum(times) / len(times), len(times), result
+
+
+def run(detectors, waveforms, sizes, min_time, log=sys.stdout, cache=None):
+    """
+    Benchmarks every detector on every waveform and size
+
+    return: list of result dicts, one per run
+    """
+    results = []
+    for size in sizes:
+        for name in waveforms:
+            y = generate(name, size, cache)
+            for detector, func, max_size in detectors:
+                if size > max_size:
+                    continue
+                entry = {"detector": detector, "waveform": name,
+                         "size": size}
+                try:
+                    # some waveforms don't suit every detector, e.g. the
+                    # slow ramp of ACV_A8, which only shows in the peaks
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        best, mean, repeats, result = measure(func, y,
+                                                              min_time)
+                except Exception as error:
+                    entry["error"] = "{0}: {1}".format(type(error).__name__,
+                                                       error)
+                else:
+                    peaks = count_peaks(result)
+                    entry.update({
+                        "wall_time": best,
+                        "mean_wall_time": mean,
+                        "repeats": repeats,
+                        "peaks": peaks,
+                        "samples_per_s": size / best,
+                        "peaks_per_s": peaks / best
+                        })
+                results.append(entry)
+                log.write(format_entry(entry) + "\n")
+                log.flush()
+            del y
+    return results
+
+
+def import_time(module, repeats=5):
+    """
+    Imports a module in 'repeats' fresh interpreters
+
+    return: the best wall time of the import in seconds
+    """
+    code = ("import time; start = time.perf_counter(); import {0}; "
+            "print(time.perf_counter() - start)").format(module)
+    folder = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for i in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], cwd=folder,
+                                stdout=subprocess.PIPE, check=True,
+                                universal_newlines=True).stdout
+        times.append(float(output))
+    return min(times)
+
+
+def run_imports(modules, overhead, log=sys.stdout):
+    """
+    Times the import of every module, the first one being the reference
+
+    return: (dict of module name to import time, list of the modules that
+        take longer than the reference by more than overhead)
+    """
+    times = {}
+    slow = []
+    for module in modules:
+        times[module] = import_time(module)
+        change = times[module] / times[modules[0]] - 1
+        log.write("import {0:<22} {1:10.4f} s  {2:+7.1%}\n".format(
+            module, times[module], change))
+        log.flush()
+        if change > overhead:
+            slow.append(module)
+    return times, slow
+
+
+def format_entry(entry, change=None):
+    """
+    return: a line of the report for one run
+    """
+    line = "{detector:<28} {waveform:<7} {size:>10}".format(**entry)
+    if "error" in entry:
+        return line + "  " + entry["error"]
+    line += "  {0:10.4f} s  {1:11.4g} samples/s  {2:10.4g} peaks/s".format(
+        entry["wall_time"], entry["samples_per_s"], entry["peaks_per_s"])
+    if change is not None:
+        line += "  {0:+7.1%}".format(change)
+    return line
+
+
+def compare(results, baseline, threshold, log=sys.stdout):
+    """
+    Compares the wall times of the results with those of a baseline run
+
+    return: the list of (entry, change) for the runs that are slower by more
+        than threshold, change being the relative increase in wall time
+    """
+    key = lambda entry: (entry["detector"], entry["waveform"], entry["size"])
+    previous = {key(entry): entry for entry in baseline["results"]}
+    regressions = []
+    log.write("\ncompared to the baseline (change in wall time):\n")
+    for entry in results:
+        old = previous.get(key(entry))
+        if old is None or "error" in entry or "error" in old:
+            continue
+        change = entry["wall_time"] / old["wall_time"] - 1
+        log.write(format_entry(entry, change) + "\n")
+        if change > threshold:
+            regressions.append((entry, change))
+    return regressions
+
+
+def environment():
+    """
+    return: a description of the machine and library versions
+    """
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+
+
+def main(argv=None, log=sys.stdout):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+        "\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=list(range(3, 9)), metavar="EXPONENT",
+                        help="signal sizes as powers of ten (default: 3-8)")
+    parser.add_argument("--detectors", nargs="+",
+                        choices=[name for name, func, size in DETECTORS],
+                        help="the detectors to run (default: all)")
+    parser.add_argument("--waveforms", nargs="+", choices=WAVEFORMS,
+                        default=WAVEFORMS,
+                        help="the waveforms to run on (default: all)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum time spent on every run in seconds, "
+                        "the best repeat is reported (default: 0.2)")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="the JSON file written (default: "
+                        "benchmark.json)")
+    parser.add_argument("--baseline",
+                        help="a JSON file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression "
+                        "(default: 0.1)")
+    parser.add_argument("--cache",
+                        help="a directory the signals are saved to as .npy "
+                        "files and reused from by later runs")
+    parser.add_argument("--imports", action="store_true",
+                        help="time the import of peakdetect against that of "
+                        "numpy instead of running the detectors")
+    parser.add_argument("--import-overhead", type=float, default=0.5,
+                        help="relative import time over numpy reported as a "
+                        "regression (default: 0.5)")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        times, slow = run_imports(IMPORTS, args.import_overhead, log)
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": [],
+                       "imports": times}, f, indent=1)
+        if slow:
+            log.write("\nimport slower than {0} by more than {1:.0%}: "
+                      "{2}\n".format(IMPORTS[0], args.import_overhead,
+                                     ", ".join(slow)))
+            return 1
+        return 0
+
+    detectors = [d for d in DETECTORS
+                 if args.detectors is None or d[0] in args.detectors]
+    sizes = [10**exponent for exponent in args.sizes]
+    if args.cache:
+        os.makedirs(args.cache, exist_ok=True)
+    results = run(detectors, args.waveforms, sizes, args.min_time, log,
+                  args.cache)
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f,
+                  indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, log)
+        if regressions:
+            log.write("\n{0} regression(s) slower by more than {1:.0%}:\n"
+                      .format(len(regressions), args.threshold))
+            for entry, change in regressions:
+                log.write(format_entry(entry, change) + "\n")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
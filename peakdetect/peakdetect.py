@@ -1,14 +1,26 @@
 # -*- coding: utf-8 -*-
 
-from math import pi, log
+import contextlib
+import functools
+from math import pi
+import os
+import threading
+import time
+import tracemalloc
 import numpy as np
-from scipy import fft, ifft
-from scipy.optimize import curve_fit
-from scipy.signal import cspline1d_eval, cspline1d
+# scipy.fft and scipy.signal are imported by the detectors that use them, as
+# importing them takes many times longer than importing numpy
 
 __all__ = [
+        "BatchFailure",
+        "PeakDetector",
+        "Profile",
+        "RaggedPeaks",
+        "ZeroCrossingTracker",
+        "batch",
         "peakdetect",
         "peakdetect_fft",
+        "peakdetect_file",
         "peakdetect_parabola",
         "peakdetect_sine",
         "peakdetect_sine_locked",
@@ -19,56 +31,387 @@ __all__ = [
         ]
 
 
-def _datacheck_peakdetect(x_axis, y_axis):
-    if x_axis is None:
-        x_axis = range(len(y_axis))
+# the 'Profile' that the stages of the detectors are recorded in, if any
+_PROFILER = None
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+class Profile(object):
+    """
+    Collects the wall time, call count, memory and samples processed of every
+    stage of the detectors, e.g. the smoothing, the zero crossing search or
+    the curve fitting, for the calls made within a 'with' block.
+    
+    Stages are timed inclusive of the stages they call. The memory is the
+    peak of the memory traced by 'tracemalloc' above what was in use when the
+    stage started. NumPy arrays are traced, which makes this the extra memory
+    a stage needs. While no profile is active the stages cost a single
+    global lookup.
+    
+    example:
     
-    if len(y_axis) != len(x_axis):
+    with Profile() as profile:
+        max_peaks, min_peaks = peakdetect_parabola(y_axis, x_axis)
+    print(profile)
+    slowest = profile.report()[0]
+    
+    keyword arguments:
+    memory -- trace the memory of the stages, which slows down the Python
+        parts of the detectors (default: True)
+    
+    attributes:
+    stages -- dict of stage name to a dict with the 'calls', 'wall_time' in
+        seconds, 'samples' processed and 'peak_bytes' over all the calls
+    """
+    
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._previous = None
+        self._tracing = False
+    
+    def __enter__(self):
+        global _PROFILER
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._previous = _PROFILER
+        _PROFILER = self
+        return self
+    
+    def __exit__(self, *exc_info):
+        global _PROFILER
+        _PROFILER = self._previous
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        return False
+    
+    @contextlib.contextmanager
+    def _stage(self, name, samples):
+        # the peak memory of finished inner stages, which reset the peak
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [0]
+        stack.append(frame)
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+            stack.pop()
+            peak = 0
+            if memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame[0])
+                if stack:
+                    stack[-1][0] = max(stack[-1][0], peak)
+                peak -= start_bytes
+            with self._lock:
+                stats = self.stages.setdefault(name, {
+                    "calls": 0, "wall_time": 0.0, "samples": 0,
+                    "peak_bytes": 0})
+                stats["calls"] += 1
+                stats["wall_time"] += wall_time
+                stats["samples"] += int(samples)
+                stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+    
+    def report(self):
+        """
+        return: a list with a dict for every stage, holding the 'stage' name,
+            the statistics of 'stages' and the 'samples_per_s', slowest stage
+            first
+        """
+        rows = []
+        for name, stats in self.stages.items():
+            row = dict(stats, stage=name)
+            row["samples_per_s"] = (stats["samples"] / stats["wall_time"]
+                                    if stats["wall_time"] else float("inf"))
+            rows.append(row)
+        return sorted(rows, key=lambda row: -row["wall_time"])
+    
+    def __str__(self):
+        lines = ["{0:<28} {1:>7} {2:>11} {3:>12} {4:>12} {5:>12}".format(
+            "stage", "calls", "wall time", "samples", "samples/s",
+            "peak bytes")]
+        for row in self.report():
+            lines.append("{stage:<28} {calls:>7} {wall_time:>10.4f}s "
+                         "{samples:>12} {samples_per_s:>12.4g} "
+                         "{peak_bytes:>12}".format(**row))
+        return "\n".join(lines)
+
+
+def _stage(name, samples):
+    """
+    return: a context manager recording a stage of a detector in the active
+        'Profile', doing nothing while none is active
+    """
+    if _PROFILER is None:
+        return _NO_STAGE
+    return _PROFILER._stage(name, samples)
+
+
+def _signal_size(y_axis, *args, **kwargs):
+    return np.size(y_axis)
+
+
+def _window_samples(index, x_axis, y_axis, points, *args, **kwargs):
+    return len(index) * points
+
+
+def _profiled(name, samples=_signal_size):
+    """
+    Decorator recording every call of a function as a stage of the active
+    'Profile'
+    
+    keyword arguments:
+    name -- the name of the stage
+    
+    samples -- called with the arguments of the function, returns the amount
+        of samples a call processes (default: the size of the first argument)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _PROFILER is None:
+                return func(*args, **kwargs)
+            with _PROFILER._stage(name, samples(*args, **kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _datacheck_peakdetect(x_axis, y_axis, axis=-1, dtype=None, x0=0, dx=None,
+                          sample_rate=None, x_required=False):
+    # arrays are used as they are, without a copy, unless a dtype is asked for
+    y_axis = np.asarray(y_axis, dtype)
+    if y_axis.ndim > 1:
+        # multi-channel data is validated once, as a view with the samples
+        # along the last axis
+        y_axis = np.moveaxis(y_axis, axis, -1)
+        if y_axis.ndim != 2:
+            raise ValueError("y_axis must have at most 2 dimensions")
+    length = y_axis.shape[-1]
+
+    # a uniform x axis is only computed for the peaks
+    if dx is not None and sample_rate is not None:
+        raise ValueError("give either dx or sample_rate, not both")
+    uniform = dx is not None or sample_rate is not None
+    if x_axis is None:
+        if x_required and not uniform:
+            raise ValueError("x_axis, dx or sample_rate must be given")
+        x_axis = _UniformAxis(length, x0, 1 if dx is None else dx,
+                              sample_rate)
+    elif uniform:
+        raise ValueError("give either x_axis or dx/sample_rate, not both")
+    elif not isinstance(x_axis, _UniformAxis):
+        x_axis = np.asarray(x_axis)
+    
+    if length != len(x_axis):
         raise ValueError( 
                 "Input vectors y_axis and x_axis must have same length")
     
-    # needs to be a numpy array
-    y_axis = np.array(y_axis)
-    x_axis = np.array(x_axis)
     return x_axis, y_axis
-    
 
-def _pad(fft_data, pad_len):
+
+class _UniformAxis(object):
     """
-    Pads fft data to interpolate in time domain
+    The x axis of a uniformly sampled signal, x0 + index * dx, computed for
+    the samples that are looked up instead of being stored. Without x0 and
+    dx it is the index of every sample, the x axis of a signal given without
+    one. Indexing it gives the same as indexing the full array would, and
+    np.asarray builds that array for the rare caller that needs all of it.
     
     keyword arguments:
-    fft_data -- the fft
-    pad_len --  By how many times the time resolution should be increased by
+    length -- the amount of samples
+    
+    x0 -- the x value of the first sample (default: 0)
+    
+    dx -- the spacing of the samples (default: 1)
     
-    return: padded list
+    sample_rate -- the sample rate, used instead of dx to give the x values
+        in seconds as x0 + index / sample_rate (default: None)
+    """
+    ndim = 1
+    
+    def __init__(self, length, x0=0, dx=1, sample_rate=None):
+        self.length = length
+        self.x0 = x0
+        self.dx = dx
+        self.sample_rate = sample_rate
+        self.dtype = np.result_type(x0, dx if sample_rate is None else
+                                    1 / sample_rate, np.intp)
+    
+    def __len__(self):
+        return self.length
+    
+    @property
+    def shape(self):
+        return (self.length,)
+    
+    @property
+    def step(self):
+        """
+        the spacing of the samples
+        """
+        return self.dx if self.sample_rate is None else 1 / self.sample_rate
+    
+    def __array__(self, dtype=None, copy=None):
+        return self[:].astype(dtype or self.dtype, copy=False)
+    
+    def _values(self, index):
+        if self.sample_rate is not None:
+            return self.x0 + index / self.sample_rate
+        if self.x0 == 0 and self.dx == 1:
+            return index
+        return self.x0 + index * self.dx
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._values(np.arange(*key.indices(self.length)))
+        index = np.asarray(key)
+        if index.dtype == bool:
+            return self._values(np.flatnonzero(index))
+        index = index.astype(np.intp)
+        if index.size and (index.max() >= self.length or
+                           index.min() < -self.length):
+            raise IndexError("index out of bounds for the x axis")
+        return self._values(np.where(index < 0, index + self.length,
+                                     index))[()]
+    
+    def min(self):
+        return min(self[0], self[-1])
+    
+    def max(self):
+        return max(self[0], self[-1])
+    
+    def searchsorted(self, v):
+        """
+        return: the insertion points of the values v in the ascending axis,
+            like np.searchsorted(np.asarray(self), v)
+        """
+        index = np.ceil((np.asarray(v) - self.x0) / self.step)
+        return np.clip(index, 0, self.length).astype(np.intp)
+
+
+def _datacheck_lookahead(lookahead, delta):
+    if lookahead < 1:
+        raise ValueError("Lookahead must be '1' or above in value")
+    if not (np.isscalar(delta) and delta >= 0):
+        raise ValueError("delta must be a positive number")
+
+
+def _datacheck_output(output):
+    if output not in ("list", "array"):
+        raise ValueError("output must be either 'list' or 'array'")
+
+
+def _datacheck_workers(workers):
+    """
+    return: the amount of threads to use, 1 for None and negative values
+        counting back from the amount of CPUs like for scipy.fft
+    """
+    if workers is None:
+        return 1
+    if workers < 0:
+        workers += (os.cpu_count() or 1) + 1
+    if workers < 1:
+        raise ValueError("workers must be a positive number, or negative to "
+                         "count back from the amount of CPUs")
+    return int(workers)
+
+
+def _thread_map(func, iterable, workers):
+    """
+    list(map(func, iterable)) spread over a pool of threads, NumPy releases
+    the GIL in the array operations that the work is made of
     """
-    l = len(fft_data)
-    n = _n(l * pad_len)
-    fft_data = list(fft_data)
+    if workers == 1:
+        return list(map(func, iterable))
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(func, iterable))
     
-    return fft_data[:l // 2] + [0] * (2**n-l) + fft_data[l // 2:]
 
+def _peak_windows(x_axis, y_axis, index, points):
+    """
+    Gathers the samples around every peak for the fitting functions. The
+    windows are moved inside the signal for peaks closer to its ends than
+    half the window.
 
-def _n(x):
+    keyword arguments:
+    x_axis -- A numpy array of all the x values
+
+    y_axis -- A numpy array of all the y values
+
+    index -- the sample index of every peak
+
+    points -- How many points around the peak should be used, must be odd
+
+
+    return: two (peaks, points) arrays with the x and y values of every
+        window
+    """
+    start = np.clip(np.asarray(index, np.intp) - points // 2, 0,
+                    len(y_axis) - points)
+    view = np.lib.stride_tricks.sliding_window_view
+    if isinstance(x_axis, _UniformAxis):
+        x_data = x_axis[start[:, np.newaxis] + np.arange(points)]
+    else:
+        x_data = view(x_axis, points)[start]
+    return x_data, view(y_axis, points)[start]
+
+
+def _fitted_waveform(x_axis, y_axis, index, points, model, output):
     """
-    Find the smallest value for n, which fulfils 2**n >= x
+    Evaluates the fitted models on a high resolution grid over the window of
+    every peak, for the 'return_fit' argument of the fitting detectors
     
     keyword arguments:
-    x -- the value, which 2**n must surpass
+    x_axis -- A numpy array of all the x values
     
-    return: the integer n
-    """
-    return int(log(x)/log(2)) + 1
+    y_axis -- A numpy array of all the y values
+    
+    index -- the sample index of every peak
+    
+    points -- How many points around the peak were used during curve fitting
+    
+    model -- the fitted models, model(x) taking a (peaks, points * 10)
+        array of x values and returning the model values of every peak
     
+    output -- 'list' or 'array'
     
-def _peakdetect_parabola_fitter(raw_peaks, x_axis, y_axis, points):
+    
+    return: for output='list' a list of [fitted_x, fitted_y] per peak, for
+        output='array' a tuple (fitted_x, fitted_y) of (peaks, points * 10)
+        arrays
+    """
+    x_data, y_data = _peak_windows(x_axis, y_axis, index, points)
+    x2 = np.linspace(x_data[:, 0], x_data[:, -1], points * 10, axis=-1)
+    y2 = model(x2)
+    if output == "array":
+        return x2, y2
+    return [[x, y] for x, y in zip(x2, y2)]
+
+
+@_profiled("parabola_fit", _window_samples)
+def _peakdetect_parabola_fitter(index, x_axis, y_axis, points):
     """
     Performs the actual parabola fitting for the peakdetect_parabola function.
+    
+    The model a * (x - tau) ** 2 + c is a quadratic polynomial in x, so all
+    the peaks are fitted at once by linear least squares: the normal
+    equations of every window are built from power sums and solved as one
+    batch of 3x3 systems, the vertex then follows in closed form.
         
     keyword arguments:
-    raw_peaks -- A list of either the maxima or the minima peaks, as given
-        by the peakdetect functions, with index used as x-axis
+    index -- the sample index of either the maxima or the minima peaks, as
+        given by the peakdetect functions
     
     x_axis -- A numpy array of all the x values
     
@@ -78,117 +421,470 @@ def _peakdetect_parabola_fitter(raw_peaks, x_axis, y_axis, points):
         fitting, must be odd.
     
     
-    return: A list giving all the peaks and the fitted waveform, format:
-        [[x, y, [fitted_x, fitted_y]]]
+    return: the arrays (tau, c, a) of the fitted model parameters, tau and c
+        being the x and y value of every peak
         
     """
-    func = lambda x, a, tau, c: a * ((x - tau) ** 2) + c
-    fitted_peaks = []
-    distance = abs(x_axis[raw_peaks[1][0]] - x_axis[raw_peaks[0][0]]) / 4
-    for peak in raw_peaks:
-        index = peak[0]
-        x_data = x_axis[index - points // 2: index + points // 2 + 1]
-        y_data = y_axis[index - points // 2: index + points // 2 + 1]
-        # get a first approximation of tau (peak position in time)
-        tau = x_axis[index]
-        # get a first approximation of peak amplitude
-        c = peak[1]
-        a = np.sign(c) * (-1) * (np.sqrt(abs(c))/distance)**2
-        """Derived from ABC formula to result in a solution where A=(rot(c)/t)**2"""
-        
-        # build list of approximations
-        p0 = (a, tau, c)
-        popt, pcov = curve_fit(func, x_data, y_data, p0)
-        # retrieve tau and c i.e x and y value of peak
-        x, y = popt[1:3]
-        
-        # create a high resolution data set for the fitted waveform
-        x2 = np.linspace(x_data[0], x_data[-1], points * 10)
-        y2 = func(x2, *popt)
+    x_data, y_data = _peak_windows(x_axis, y_axis, index, points)
+    # centre and scale every window for a well conditioned system
+    x_mid = x_data[:, points // 2]
+    scale = (x_data[:, -1] - x_data[:, 0]) / 2
+    u = (x_data - x_mid[:, np.newaxis]) / scale[:, np.newaxis]
+    
+    # normal equations, the matrix holds the power sums of u up to u ** 4
+    u2 = u * u
+    u_sums = [np.full(len(u), float(points)), u.sum(axis=1), u2.sum(axis=1),
+              (u2 * u).sum(axis=1), (u2 * u2).sum(axis=1)]
+    lhs = np.stack([np.stack(u_sums[i:i + 3], axis=-1) for i in range(3)],
+                   axis=1)
+    rhs = np.stack([y_data.sum(axis=1), (y_data * u).sum(axis=1),
+                    (y_data * u2).sum(axis=1)], axis=-1)
+    p0, p1, p2 = np.linalg.solve(lhs, rhs[..., np.newaxis])[..., 0].T
+    
+    # vertex of y = p0 + p1 * u + p2 * u ** 2
+    tau = x_mid - scale * p1 / (2 * p2)
+    c = p0 - p1 * p1 / (4 * p2)
+    a = p2 / scale ** 2
         
-        fitted_peaks.append([x, y, [x2, y2]])
-        
-    return fitted_peaks
+    return tau, c, a
 
-    
-def peakdetect(y_axis, x_axis=None, lookahead=200, delta=0):
+
+@_profiled("gauss_newton",
+           lambda func, jac, x_data, *args, **kwargs: np.size(x_data))
+def _gauss_newton(func, jac, x_data, y_data, p0, iterations=100,
+                  xtol=1.49012e-08):
     """
-    Converted from/based on a MATLAB script at: 
-    http://billauer.co.il/peakdet.html
+    Fits a model to many windows of data at once by least squares with
+    Levenberg-Marquardt damped Gauss-Newton steps. The residuals and
+    Jacobians of all windows are stacked and every iteration solves one
+    batch of normal equations. Every window has its own damping: a step that
+    lowers the sum of squares is taken and the damping lowered, otherwise
+    the step is rejected and the damping raised, which shortens the next step
+    towards the steepest descent. Windows whose step has become negligible
+    are masked out, so the remaining iterations only work on the windows
+    that are still moving.
     
-    function for detecting local maxima and minima in a signal.
-    Discovers peaks by searching for values which are surrounded by lower
-    or larger values for maxima and minima respectively
+    keyword arguments:
+    func -- the model func(x, p) giving the (windows, points) model values
+        for the parameters p of every window
+    
+    jac -- the Jacobian jac(x, p) of the model with the shape
+        (windows, points, parameters)
+    
+    x_data -- (windows, points) array of the x values
+    
+    y_data -- (windows, points) array of the y values
+    
+    p0 -- (windows, parameters) array of initial guesses
+    
+    iterations -- the largest number of iterations (default: 100)
+    
+    xtol -- relative change of the parameters at which a window has
+        converged (default: 1.49012e-08, as scipy's 'curve_fit')
+    
+    
+    return: the fitted (windows, parameters) and a boolean array telling
+        which windows converged. Windows that didn't converge keep their
+        best estimate.
+    """
+    p = np.array(p0, np.float64)
+    damping = np.full(len(p), 1e-3)
+    cost = ((y_data - func(x_data, p)) ** 2).sum(axis=1)
+    active = np.arange(len(p))
+    for _ in range(iterations):
+        if not len(active):
+            break
+        x, y, p_active = x_data[active], y_data[active], p[active]
+        residual = y - func(x, p_active)
+        J = jac(x, p_active)
+        JT = np.swapaxes(J, 1, 2)
+        lhs = np.matmul(JT, J)
+        rhs = np.matmul(JT, residual[..., np.newaxis])
+        # the damping is scaled by the diagonal, as Marquardt did
+        diagonal = np.arange(lhs.shape[-1])
+        lhs[:, diagonal, diagonal] *= 1 + damping[active, np.newaxis]
+        try:
+            step = np.linalg.solve(lhs, rhs)[..., 0]
+        except np.linalg.LinAlgError:
+            # a degenerate window, e.g. without any amplitude
+            step = np.matmul(np.linalg.pinv(lhs), rhs)[..., 0]
+        p_new = p_active + step
+        new_cost = ((y - func(x, p_new)) ** 2).sum(axis=1)
+        better = new_cost <= cost[active]
+        p[active[better]] = p_new[better]
+        cost[active[better]] = new_cost[better]
+        damping[active] = np.clip(np.where(better, damping[active] / 10,
+                                           damping[active] * 10),
+                                  1e-12, 1e12)
+        done = np.all(np.abs(step) <= xtol * (np.abs(p_active) + xtol),
+                      axis=1)
+        active = active[~done]
+    
+    converged = np.ones(len(p), bool)
+    converged[active] = False
+    return p, converged
+
+
+@_profiled("sine_fit", _window_samples)
+def _peakdetect_sine_fitter(index, x_axis, y_axis, points, offset, Hz,
+                            lock_frequency):
+    """
+    Performs the actual sine fitting for the peakdetect_sine function, all
+    the peaks at once with '_gauss_newton'.
     
     keyword arguments:
-    y_axis -- A list containing the signal over which to find peaks
+    index -- the sample index of either the maxima or the minima peaks, as
+        given by the peakdetect functions
     
-    x_axis -- A x-axis whose values correspond to the y_axis list and is used
-        in the return to specify the position of the peaks. If omitted an
-        index of the y_axis is used.
-        (default: None)
+    x_axis -- A numpy array of all the x values
     
-    lookahead -- distance to look ahead from a peak candidate to determine if
-        it is the actual peak
-        (default: 200) 
-        '(samples / period) / f' where '4 >= f >= 1.25' might be a good value
+    y_axis -- A numpy array of all the y values
     
-    delta -- this specifies a minimum difference between a peak and
-        the following points, before a peak may be considered a peak. Useful
-        to hinder the function from picking up false peaks towards to end of
-        the signal. To work well delta should be set to delta >= RMSnoise * 5.
-        (default: 0)
-            When omitted delta function causes a 20% decrease in speed.
-            When used Correctly it can double the speed of the function
+    points -- How many points around the peak should be used during curve
+        fitting, must be odd.
     
+    offset -- the offset of the signal, removed before fitting
     
-    return: two lists [max_peaks, min_peaks] containing the positive and
-        negative peaks respectively. Each cell of the lists contains a tuple
-        of: (position, peak_value) 
-        to get the average peak value do: np.mean(max_peaks, 0)[1] on the
-        results to unpack one of the lists into x, y coordinates do: 
-        x, y = zip(*max_peaks)
+    Hz -- approximate frequency of the signal in units of the x_axis
+    
+    lock_frequency -- keep the frequency at Hz instead of fitting it
+    
+    
+    return: the arrays (tau, A, Hz) of the fitted model parameters, where
+        tau and A + offset are the x and y value of every peak. Peaks whose
+        fit didn't converge, or put the peak outside its window, are fitted
+        again with the frequency locked, which is well determined by few
+        points. A locked fit may put the peak outside its window, as
+        'curve_fit' did, but keeps the raw peak and Hz if it didn't
+        converge or moved the peak by half a period or more.
     """
+    x_data, y_data = _peak_windows(x_axis, y_axis, index, points)
+    # subtract offset from wave-shape
+    y_data = y_data - offset
+    
+    # model function
+    # if cosine is used then tau could equal the x position of the peak
+    # if sine were to be used then tau would be the first zero crossing
+    def unpack(x, p):
+        A, tau = p[:, :1], p[:, -1:]
+        f = Hz if lock_frequency else p[:, 1:2]
+        return A, f, tau, 2 * pi * f * (x - tau)
+    
+    def func(x, p):
+        A, f, tau, phase = unpack(x, p)
+        return A * np.cos(phase)
+    
+    def jac(x, p):
+        A, f, tau, phase = unpack(x, p)
+        # derivative of the model with respect to the phase, times 2 * pi
+        d_phase = -A * np.sin(phase) * 2 * pi
+        columns = [np.cos(phase)]
+        if not lock_frequency:
+            columns.append(d_phase * (x - tau))
+        columns.append(-d_phase * f)
+        return np.stack(columns, axis=-1)
+    
+    # first approximations of the peak amplitude and position in time
+    p0 = [y_axis[index] - offset, x_axis[index]]
+    if not lock_frequency:
+        p0.insert(1, np.full(len(index), Hz))
+    p0 = np.stack(p0, axis=-1)
+    popt, converged = _gauss_newton(func, jac, x_data, y_data, p0)
+    
+    tau = popt[:, -1]
+    if lock_frequency:
+        # the vertex of a noisy peak may well lie outside the window, but a
+        # fit that moved it by half a period or more, or flipped the sign of
+        # the peak, has found another peak of the model
+        failed = ~(converged & (np.abs(tau - p0[:, -1]) * Hz < 0.5) &
+                   (popt[:, 0] * p0[:, 0] > 0))
+    else:
+        # the frequency is poorly determined by a window of a few samples,
+        # so a vertex outside it is left to the locked fit
+        failed = ~(converged & (tau >= x_data[:, 0]) & (tau <= x_data[:, -1]))
+    if lock_frequency:
+        popt[failed] = p0[failed]
+    elif failed.any():
+        tau, A, f = _peakdetect_sine_fitter(index[failed], x_axis, y_axis,
+                                            points, offset, Hz, True)
+        popt[failed] = np.stack([A, f, tau], axis=-1)
+    A, tau = popt[:, 0], popt[:, -1]
+    f = np.full(len(index), Hz) if lock_frequency else popt[:, 1]
+    return tau, A, f
+
+
+@_profiled("sliding_extreme")
+def _sliding_extreme(y_axis, window, ufunc, chunk=1 << 20):
+    """
+    Sliding window maximum or minimum using the van Herk/Gil-Werman
+    algorithm, which needs 3 comparisons per sample regardless of the window
+    size.
+
+    keyword arguments:
+    y_axis -- A numpy array, the window slides along the last axis
+
+    window -- the length of the window
+
+    ufunc -- np.maximum or np.minimum
+
+    chunk -- amount of windows evaluated per pass, bounds the size of the
+        temporary arrays (default: 1 << 20)
+
+
+    return: array with the extreme of y_axis[..., i:i + window] for every
+        i in range(y_axis.shape[-1] - window + 1)
+    """
+    shape = y_axis.shape[:-1]
+    length = y_axis.shape[-1] - window + 1
+    if length < 1:
+        return y_axis[..., :0].copy()
+    if window == 1:
+        return y_axis.copy()
+
+    result = np.empty(shape + (length,), y_axis.dtype)
+    # round the chunk to whole blocks, shared by all channels
+    chunk = max(chunk // (window * max(int(np.prod(shape)), 1)), 1) * window
+    for start in range(0, length, chunk):
+        stop = min(start + chunk, length)
+        data = y_axis[..., start:stop + window - 1]
+        size = data.shape[-1]
+        blocks = -(-size // window)
+        # padding only ever ends up in windows that are not evaluated
+        padded = np.empty(shape + (blocks * window,), data.dtype)
+        padded[..., :size] = data
+        padded[..., size:] = data[..., -1:]
+        padded = padded.reshape(shape + (blocks, window))
+        # running extreme from the start respective end of every block
+        prefix = ufunc.accumulate(padded, axis=-1).reshape(shape + (-1,))
+        suffix = ufunc.accumulate(padded[..., ::-1], axis=-1)[..., ::-1]
+        suffix = suffix.reshape(shape + (-1,))
+        n = stop - start
+        ufunc(suffix[..., :n], prefix[..., window - 1:window - 1 + n],
+              out=result[..., start:stop])
+
+    return result
+
+
+@_profiled("peakdetect_scan",
+           lambda y_axis, wmax, wmin, delta, stop, state, *args: stop -
+           state[0])
+def _peakdetect_scan(y_axis, wmax, wmin, delta, stop, state, confirmed=None):
+    """
+    Vectorized version of the hysteresis state machine in 'peakdetect'.
+
+    The signal is searched block by block for the first index that confirms
+    the current peak candidate, with the block size adapting to the distance
+    between peaks. Gives exactly the same peaks as the per-sample loop used
+    by the 'python' engine, also for NaN samples: they never become a
+    candidate, and a NaN within the look ahead keeps a candidate from being
+    confirmed.
+
+    keyword arguments:
+    y_axis -- A numpy array containing the signal
+
+    wmax -- y_axis[i:i + lookahead].max() for every evaluated index i
+
+    wmin -- y_axis[i:i + lookahead].min() for every evaluated index i
+
+    delta -- see 'peakdetect'
+
+    stop -- the first index that may not be evaluated
+
+    state -- list of [index, mode, mx, mxpos, mn, mnpos], where index is the
+        next index to evaluate and mode is 0 while both a maxima and a minima
+        is searched for, 1 while only a maxima and -1 while only a minima is
+        searched for. A None extreme has not seen any samples yet.
+        The list is updated in place, which allows the scan to be resumed.
+
+    confirmed -- a list that the index at which each peak is confirmed is
+        appended to, the state is reset after that index (default: None)
+
+
+    return: A list of (position, is_max) for every confirmed peak
+    """
+    index, mode, mx, mxpos, mn, mnpos = state
+    peaks = []
+    start = index
+    block = _SCAN_BLOCK
+
+    while index < stop:
+        end = min(index + block, stop)
+        seg = y_axis[index:end]
+        hit = None
+        if mode >= 0:
+            # running maxima candidate, updated on strictly larger values
+            run_mx = np.fmax.accumulate(seg)
+            if mx is not None:
+                np.fmax(run_mx, mx, out=run_mx)
+            hit_mx = wmax[index:end] < run_mx
+            if delta:
+                hit_mx &= seg < run_mx - delta
+            hit = hit_mx
+        if mode <= 0:
+            run_mn = np.fmin.accumulate(seg)
+            if mn is not None:
+                np.fmin(run_mn, mn, out=run_mn)
+            hit_mn = wmin[index:end] > run_mn
+            if delta:
+                hit_mn &= seg > run_mn + delta
+            hit = hit_mn if hit is None else hit | hit_mn
+
+        if not hit.any():
+            # carry the candidates over to the next block, an unset
+            # candidate is -inf respective inf as in the loop, which a block
+            # of only NaN doesn't replace
+            if mode >= 0 and run_mx[-1] > (-np.inf if mx is None else mx):
+                mx, mxpos = run_mx[-1], index + (seg == run_mx[-1]).argmax()
+            if mode <= 0 and run_mn[-1] < (np.inf if mn is None else mn):
+                mn, mnpos = run_mn[-1], index + (seg == run_mn[-1]).argmax()
+            index = end
+            block *= 2
+            continue
+
+        k = hit.argmax()
+        # a maxima is checked before a minima at the same index
+        is_max = mode == 1 or (mode == 0 and hit_mx[k])
+        if is_max:
+            extreme = run_mx[k]
+            new = extreme > (-np.inf if mx is None else mx)
+        else:
+            extreme = run_mn[k]
+            new = extreme < (np.inf if mn is None else mn)
+        if new:
+            peak = index + (seg[:k + 1] == extreme).argmax()
+        else:
+            peak = mxpos if is_max else mnpos
+        peaks.append((peak, is_max))
+        if confirmed is not None:
+            confirmed.append(index + k)
+
+        # set algorithm to only find the opposite peak now
+        mode = -1 if is_max else 1
+        mx = mxpos = mn = mnpos = None
+        index += k + 1
+        # guess the next peak to be about as far away as this one
+        block = min(max(2 * (index - start), 64), 1 << 16)
+        start = index
+
+    state[:] = [index, mode, mx, mxpos, mn, mnpos]
+    return peaks
+
+
+def _peakdetect_numpy(y_axis, lookahead, delta):
+    """
+    Vectorized engine of the 'peakdetect' function, the sliding window
+    extremes of 2-D data are calculated for all channels in one pass
+
+    return: list of (index, is_max) for every peak found, one such list per
+        channel for 2-D data
+    """
+    stop = y_axis.shape[-1] - lookahead
+    if stop < 1:
+        return [[] for y in y_axis] if y_axis.ndim > 1 else []
+
+    wmax = _sliding_extreme(y_axis, lookahead, np.maximum)
+    wmin = _sliding_extreme(y_axis, lookahead, np.minimum)
+    if y_axis.ndim > 1:
+        return [_peakdetect_scan(y, mx, mn, delta, stop,
+                                 [0, 0, None, None, None, None])
+                for y, mx, mn in zip(y_axis, wmax, wmin)]
+
+    return _peakdetect_scan(y_axis, wmax, wmin, delta, stop,
+                            [0, 0, None, None, None, None])
+
+
+def _peakdetect_segmented(y_axis, lookahead, delta, workers):
+    """
+    Parallel engine of the 'peakdetect' function for a single channel.
+
+    The signal is split into segments that are scanned at the same time, each
+    from a blank state as if it was the start of the signal. The segments are
+    then stitched in order: the true state at the start of a segment is
+    scanned forward until it confirms a peak at the same index and of the
+    same kind as the scan of the segment did, since both scans are reset to
+    the same state there and agree from then on. The peaks are always those
+    of '_peakdetect_numpy', whatever the amount of workers.
+
+    return: list of (index, is_max) for every peak found
+    """
+    stop = len(y_axis) - lookahead
+    if stop < 1:
+        return []
+    count = max(min(4 * workers,
+                    stop // max(_SEGMENT_MIN, 16 * lookahead)), 1)
+    bounds = np.linspace(0, stop, count + 1).astype(np.intp)
+    # the window extremes of every segment need 'lookahead' samples of the
+    # next one
+    wmax = np.empty(stop, y_axis.dtype)
+    wmin = np.empty(stop, y_axis.dtype)
+
+    def scan(segment):
+        start, end = bounds[segment], bounds[segment + 1]
+        data = y_axis[start:end + lookahead - 1]
+        wmax[start:end] = _sliding_extreme(data, lookahead, np.maximum)
+        wmin[start:end] = _sliding_extreme(data, lookahead, np.minimum)
+        state = [start, 0, None, None, None, None]
+        confirmed = []
+        peaks = _peakdetect_scan(y_axis, wmax, wmin, delta, end, state,
+                                 confirmed)
+        return peaks, confirmed, state
+
+    segments = _thread_map(scan, range(count), workers)
+    peaks, confirmed, state = segments[0]
+    for (segment_peaks, confirmed, segment_state), end in zip(segments[1:],
+                                                              bounds[2:]):
+        for j, (index, (pos, is_max)) in enumerate(zip(confirmed,
+                                                       segment_peaks)):
+            peaks += _peakdetect_scan(y_axis, wmax, wmin, delta, index + 1,
+                                      state)
+            if (state[1] == (-1 if is_max else 1) and state[2] is None and
+                state[4] is None):
+                # confirmed at the same index, the rest of the segment is
+                # the same
+                peaks += segment_peaks[j + 1:]
+                state = segment_state
+                break
+        else:
+            peaks += _peakdetect_scan(y_axis, wmax, wmin, delta, end, state)
+
+    return peaks
+
+
+@_profiled("peakdetect_python")
+def _peakdetect_python(y_axis, lookahead, delta):
+    """
+    Reference engine of the 'peakdetect' function, walking the signal one
+    sample at a time
+
+    return: list of (index, is_max) for every peak found
+    """
+    peaks = []
 
-    max_peaks = []
-    min_peaks = []
-    dump = []   # Used to pop the first hit which almost always is false
-       
-    # check input data
-    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis)
     # store data length for later use
     length = len(y_axis)
 
-    # perform some checks
-    if lookahead < 1:
-        raise ValueError("Lookahead must be '1' or above in value")
-    if not (np.isscalar(delta) and delta >= 0):
-        raise ValueError("delta must be a positive number")
-    
     # maxima and minima candidates are temporarily stored in
     # mx and mn respectively
-    mn, mx = np.Inf, -np.Inf
-    
+    mn, mx = np.inf, -np.inf
+
     # Only detect peak if there is 'lookahead' amount of points after it
-    for index, (x, y) in enumerate(zip(x_axis[:-lookahead], 
-                                        y_axis[:-lookahead])):
+    for index, y in enumerate(y_axis[:-lookahead]):
         if y > mx:
             mx = y
-            mxpos = x
+            mxpos = index
         if y < mn:
             mn = y
-            mnpos = x
-        
+            mnpos = index
+
         # look for max
-        if y < mx-delta and mx != np.Inf:
+        if y < mx-delta and mx != np.inf:
             # Maxima peak candidate found
             # look ahead in signal to ensure that this is a peak and not jitter
             if y_axis[index:index+lookahead].max() < mx:
-                max_peaks.append([mxpos, mx])
-                dump.append(True)
+                peaks.append((mxpos, True))
                 # set algorithm to only find minima now
-                mx = np.Inf
-                mn = np.Inf
+                mx = np.inf
+                mn = np.inf
                 if index+lookahead >= length:
                     # end is within lookahead no more peaks can be found
                     break
@@ -196,17 +892,16 @@ def peakdetect(y_axis, x_axis=None, lookahead=200, delta=0):
             # else:  # slows shit down this does
             #     mx = ahead
             #     mxpos = x_axis[np.where(y_axis[index:index+lookahead]==mx)]
-        
+
         # look for min
-        if y > mn+delta and mn != -np.Inf:
+        if y > mn+delta and mn != -np.inf:
             # Minima peak candidate found
             # look ahead in signal to ensure that this is a peak and not jitter
             if y_axis[index:index+lookahead].min() > mn:
-                min_peaks.append([mnpos, mn])
-                dump.append(False)
+                peaks.append((mnpos, False))
                 # set algorithm to only find maxima now
-                mn = -np.Inf
-                mx = -np.Inf
+                mn = -np.inf
+                mx = -np.inf
                 if index+lookahead >= length:
                     # end is within lookahead no more peaks can be found
                     break
@@ -214,21 +909,572 @@ def peakdetect(y_axis, x_axis=None, lookahead=200, delta=0):
             #     mn = ahead
             #     mnpos = x_axis[np.where(y_axis[index:index+lookahead]==mn)]
 
-    # Remove the false hit on the first value of the y_axis
+    return peaks
+
+
+def _per_channel(func, x_axis, y_axis, *args, **kwargs):
+    """
+    Runs a single channel detector on every channel of 2-D data that has
+    already passed '_datacheck_peakdetect'
+
+    return: [max_peaks, min_peaks] joined by '_join_channels'
+    """
+    results = list(zip(*[func(y, x_axis, *args, **kwargs) for y in y_axis]))
+    # any fitted waveforms follow the peaks, see '_format_fit'
+    return ([_join_channels(peaks) for peaks in results[:2]] +
+            [_join_fits(fits) for fits in results[2:]])
+
+
+def _join_channels(peaks):
+    """
+    Joins the peaks found in every channel of 2-D data
+
+    keyword arguments:
+    peaks -- the peaks of every channel, either as lists of
+        [position, peak_value] or as structured arrays
+
+
+    return: RaggedPeaks for lists, or a structured array with the field
+        'channel' in front for structured arrays
+    """
+    if not peaks or not isinstance(peaks[0], np.ndarray):
+        return RaggedPeaks.from_lists(peaks)
+
+    channel = np.repeat(np.arange(len(peaks)), [len(p) for p in peaks])
+    joined = np.concatenate(peaks)
+    result = np.empty(len(joined), [("channel", np.intp)] + joined.dtype.descr)
+    result["channel"] = channel
+    for name in joined.dtype.names:
+        result[name] = joined[name]
+    return result
+
+
+def _join_fits(fits):
+    """
+    Joins the fitted waveforms of every channel of 2-D data
+
+    return: for output='list' a list with the fitted waveforms of every
+        channel, for output='array' the (x, y) arrays of all the channels
+        stacked in the order of the joined structured array
+    """
+    if fits and isinstance(fits[0], tuple):
+        return tuple(np.concatenate(arrays) for arrays in zip(*fits))
+    return list(fits)
+
+
+def _peak_array(index, x, y, fit=(), channel=None):
+    """
+    Builds the structured array returned by the detectors when called with
+    output='array'
+
+    keyword arguments:
+    index -- the index of the sample each peak was found at
+
+    x -- the position of every peak
+
+    y -- the value of every peak
+
+    fit -- sequence of (name, values) with fitted model parameters that are
+        added as float fields after 'y' (default: ())
+
+    channel -- the channel of every peak for 2-D data (default: None)
+
+
+    return: structured array with the fields 'index', 'x', 'y' and any
+        fitted parameters, preceded by 'channel' when given
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    fields = [("index", np.intp), ("x", x.dtype), ("y", y.dtype)]
+    values = [index, x, y]
+    if channel is not None:
+        fields.insert(0, ("channel", np.intp))
+        values.insert(0, channel)
+    for name, param in fit:
+        fields.append((name, np.float64))
+        values.append(param)
+
+    peaks = np.empty(len(x), fields)
+    for (name, dtype), param in zip(fields, values):
+        peaks[name] = param
+    return peaks
+
+
+def _nearest_index(x_axis, x):
+    """
+    Finds the index of the sample closest to each of the positions x in the
+    ascending x_axis
+    """
+    index = np.clip(x_axis.searchsorted(x), 1, len(x_axis) - 1)
+    index -= x - x_axis[index - 1] < x_axis[index] - x
+    return index
+
+
+def _format_peaks(x_axis, y_axis, index, output):
+    """
+    Formats the peaks at the given sample indices in the requested output
+
+    return: list of [position, peak_value] or a structured array
+    """
+    index = np.asarray(index, np.intp)
+    if output == "array":
+        return _peak_array(index, x_axis[index], y_axis[index])
+    return [[x, y] for x, y in zip(x_axis[index], y_axis[index])]
+
+
+def _format_hits(x_axis, y_axis, peaks, output):
+    """
+    Formats the hits of the 'peakdetect' engines after removing the false
+    first hit
+
+    keyword arguments:
+    x_axis -- A numpy array of all the x values
+
+    y_axis -- A numpy array of all the y values
+
+    peaks -- list of (index, is_max), or one such list per channel for 2-D
+        y_axis
+
+    output -- 'list' or 'array'
+
+
+    return: [max_peaks, min_peaks]
+    """
+    if y_axis.ndim > 1:
+        # Remove the false hit on the first value of every channel
+        peaks = [channel_peaks[1:] for channel_peaks in peaks]
+        channel = np.repeat(np.arange(len(peaks)), [len(p) for p in peaks])
+        peaks = [peak for channel_peaks in peaks for peak in channel_peaks]
+    else:
+        # Remove the false hit on the first value of the y_axis
+        peaks = peaks[1:]
+
+    index = np.array([pos for pos, is_max in peaks], np.intp)
+    is_max = np.array([is_max for pos, is_max in peaks], bool)
+    if y_axis.ndim == 1:
+        return [_format_peaks(x_axis, y_axis, index[is_max], output),
+                _format_peaks(x_axis, y_axis, index[~is_max], output)]
+    return [_format_channel_peaks(x_axis, y_axis, channel[select],
+                                  index[select], output)
+            for select in (is_max, ~is_max)]
+
+
+def _format_channel_peaks(x_axis, y_axis, channel, index, output):
+    """
+    Formats the peaks of a 2-D y_axis given by their channel and sample
+    index, ordered by channel, in the requested output
+
+    return: RaggedPeaks or a structured array with a 'channel' field
+    """
+    if output == "array":
+        return _peak_array(index, x_axis[index], y_axis[channel, index],
+                           channel=channel)
+    return RaggedPeaks.from_index(x_axis, y_axis, channel, index)
+
+
+class RaggedPeaks(object):
+    """
+    The peaks of every channel of a 2-D signal, stored back to back in flat
+    arrays. This is what the detectors return for each of max_peaks and
+    min_peaks when given a (channels, samples) array.
+
+    Indexing with a channel number gives the peaks of that channel as a list
+    of [position, peak_value], just like for a 1-D signal.
+
+    attributes:
+    x -- the position of every peak
+
+    y -- the value of every peak
+
+    offsets -- the peaks of channel i are x[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, x, y, offsets):
+        self.x = x
+        self.y = y
+        self.offsets = offsets
+
+    @classmethod
+    def from_lists(cls, peak_lists):
+        """
+        Build from one list of [position, peak_value] per channel
+        """
+        peak_lists = [list(peaks) for peaks in peak_lists]
+        offsets = np.zeros(len(peak_lists) + 1, np.intp)
+        np.cumsum([len(peaks) for peaks in peak_lists], out=offsets[1:])
+        x = np.array([peak[0] for peaks in peak_lists for peak in peaks])
+        y = np.array([peak[1] for peaks in peak_lists for peak in peaks])
+        return cls(x, y, offsets)
+
+    @classmethod
+    def from_index(cls, x_axis, y_axis, channel, index):
+        """
+        Build from the channel and sample index of every peak of the 2-D
+        y_axis, ordered by channel
+        """
+        offsets = np.zeros(len(y_axis) + 1, np.intp)
+        np.cumsum(np.bincount(channel, minlength=len(y_axis)),
+                  out=offsets[1:])
+        return cls(x_axis[index], y_axis[channel, index], offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, channel):
+        channel = range(len(self))[channel]
+        start, stop = self.offsets[channel], self.offsets[channel + 1]
+        return [[x, y] for x, y in zip(self.x[start:stop], self.y[start:stop])]
+
+    def __iter__(self):
+        for channel in range(len(self)):
+            yield self[channel]
+
+    def __repr__(self):
+        return "RaggedPeaks(channels={0}, peaks={1})".format(
+            len(self), len(self.x))
+
+    def counts(self):
+        """
+        return: the number of peaks in every channel
+        """
+        return np.diff(self.offsets)
+
+
+_SCAN_BLOCK = 4096
+
+# segments of a signal scanned in parallel by 'peakdetect' are at least this
+# long
+_SEGMENT_MIN = 1 << 16
+
+_PEAKDETECT_ENGINES = {
+    "numpy": _peakdetect_numpy,
+    "python": _peakdetect_python
+    }
+
+
+@_profiled("peakdetect")
+def peakdetect(y_axis, x_axis=None, lookahead=200, delta=0, engine="numpy",
+               axis=-1, output="list", workers=None, dtype=None, x0=0,
+               dx=None, sample_rate=None, backend=None):
+    """
+    Converted from/based on a MATLAB script at: 
+    http://billauer.co.il/peakdet.html
+    
+    function for detecting local maxima and minima in a signal.
+    Discovers peaks by searching for values which are surrounded by lower
+    or larger values for maxima and minima respectively
+    
+    keyword arguments:
+    y_axis -- A list containing the signal over which to find peaks
+    
+    x_axis -- A x-axis whose values correspond to the y_axis list and is used
+        in the return to specify the position of the peaks. If omitted an
+        index of the y_axis is used.
+        (default: None)
+    
+    lookahead -- distance to look ahead from a peak candidate to determine if
+        it is the actual peak
+        (default: 200) 
+        '(samples / period) / f' where '4 >= f >= 1.25' might be a good value
+    
+    delta -- this specifies a minimum difference between a peak and
+        the following points, before a peak may be considered a peak. Useful
+        to hinder the function from picking up false peaks towards to end of
+        the signal. To work well delta should be set to delta >= RMSnoise * 5.
+        (default: 0)
+            When omitted delta function causes a 20% decrease in speed.
+            When used Correctly it can double the speed of the function
+    
+    engine -- 'numpy' for the vectorized engine, which scans the signal in
+        blocks using sliding window extremes, or 'python' for the original
+        loop over every sample. Both give identical results.
+        (default: 'numpy')
+    
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    
+    output -- 'list' for lists of [position, peak_value], or 'array' for
+        structured numpy arrays with the fields 'index', 'x' and 'y'
+        (default: 'list')
+    
+    workers -- the amount of threads that segments of the signal are scanned
+        in with the 'numpy' engine, negative values count back from the
+        amount of CPUs. The peaks are the same for any amount of workers.
+        (default: None, a single thread)
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    
+    x0 -- the x value of the first sample when x_axis is omitted
+        (default: 0)
+    
+    dx -- the spacing of the samples of a uniformly sampled signal, used
+        instead of x_axis. Only the x values of the peaks are then computed.
+        (default: None)
+    
+    sample_rate -- used instead of dx to give the positions in seconds
+        (default: None)
+    
+    backend -- 'numba' to run the single threaded 'numpy' engine as a loop
+        compiled by Numba, 'numpy' for the vectorized scan, or 'auto' for
+        'numba' whenever Numba is installed. Both give identical results.
+        (default: None, the PEAKDETECT_BACKEND environment variable or else
+        'auto')
+    
+    
+    return: two lists [max_peaks, min_peaks] containing the positive and
+        negative peaks respectively. Each cell of the lists contains a tuple
+        of: (position, peak_value) 
+        to get the average peak value do: np.mean(max_peaks, 0)[1] on the
+        results to unpack one of the lists into x, y coordinates do: 
+        x, y = zip(*max_peaks)
+        For 2-D input max_peaks and min_peaks are RaggedPeaks holding the
+        peaks of every channel, or structured arrays with an additional
+        'channel' field for output='array'.
+    """
+    # check input data
+    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis, axis, dtype, x0, dx,
+                                           sample_rate)
+
+    # perform some checks
+    _datacheck_lookahead(lookahead, delta)
+    _datacheck_output(output)
+    workers = _datacheck_workers(workers)
     try:
-        if dump[0]:
-            max_peaks.pop(0)
+        engine_func = _PEAKDETECT_ENGINES[engine]
+    except KeyError:
+        raise ValueError("engine must be one of {0}".format(
+            ", ".join(sorted(_PEAKDETECT_ENGINES))))
+    kernels = _datacheck_backend(backend)
+
+    if workers > 1:
+        if engine_func is not _peakdetect_numpy:
+            raise ValueError("workers are only supported by the 'numpy' "
+                             "engine")
+        if y_axis.ndim > 1:
+            peaks = [_peakdetect_segmented(y, lookahead, delta, workers)
+                     for y in y_axis]
         else:
-            min_peaks.pop(0)
-        del dump
-    except IndexError:
-        # no peaks were found, should the function return empty lists?
-        pass
-        
-    return [max_peaks, min_peaks]
+            peaks = _peakdetect_segmented(y_axis, lookahead, delta, workers)
+    elif y_axis.ndim > 1 and engine_func is not _peakdetect_numpy:
+        peaks = [engine_func(y, lookahead, delta) for y in y_axis]
+    elif engine_func is _peakdetect_numpy:
+        peaks = kernels["peakdetect"](y_axis, lookahead, delta)
+    else:
+        peaks = engine_func(y_axis, lookahead, delta)
+
+    return _format_hits(x_axis, y_axis, peaks, output)
+
+
+class PeakDetector(object):
+    """
+    Streaming version of the 'peakdetect' function for signals that arrive
+    in chunks, e.g. from a continuous acquisition.
+
+    The state of the peak search is carried from one chunk to the next and
+    only the last 'lookahead' samples are kept between chunks, so memory
+    stays constant for unbounded streams. The peaks are identical to those
+    of a single 'peakdetect' call on the concatenated signal, regardless of
+    how the signal is chunked.
+
+    example:
+
+    detector = PeakDetector(lookahead=200)
+    for chunk in stream:
+        max_peaks, min_peaks = detector.push(chunk)
+    detector.flush()
+
+    keyword arguments:
+    lookahead -- see 'peakdetect' (default: 200)
+
+    delta -- see 'peakdetect' (default: 0)
+    """
+
+    def __init__(self, lookahead=200, delta=0):
+        _datacheck_lookahead(lookahead, delta)
+        self.lookahead = lookahead
+        self.delta = delta
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all samples and start over as if newly created
+        """
+        # global index of the first sample kept in the carry buffer
+        self._offset = 0
+        self._y = None
+        self._x = None
+        self._use_x = None
+        # scan state with global positions, see '_peakdetect_scan'
+        self._state = [0, 0, None, None, None, None]
+        # x values of candidates that have left the carry buffer
+        self._candidate_x = {}
+        # the first hit is almost always false and is dropped
+        self._first = True
+
+    def push(self, y_chunk, x_chunk=None):
+        """
+        Feed the next chunk of the signal to the detector.
+
+        keyword arguments:
+        y_chunk -- The next samples of the signal
+
+        x_chunk -- x values corresponding to y_chunk. Must either be given
+            for every chunk or for none of them, in which case the global
+            sample index is used. (default: None)
+
+
+        return: two lists [max_peaks, min_peaks] with the peaks confirmed by
+            this chunk, in the format of 'peakdetect'
+        """
+        y_chunk = np.asarray(y_chunk)
+        if self._use_x is None:
+            self._use_x = x_chunk is not None
+        elif self._use_x != (x_chunk is not None):
+            raise ValueError(
+                "x_chunk must be given for either all or none of the chunks")
+        if x_chunk is None:
+            start = self._offset + (0 if self._y is None else len(self._y))
+            x_chunk = np.arange(start, start + len(y_chunk))
+        else:
+            x_chunk = np.asarray(x_chunk)
+            if len(x_chunk) != len(y_chunk):
+                raise ValueError(
+                    "Input vectors y_chunk and x_chunk must have same length")
+
+        if self._y is None:
+            y_axis, x_axis = y_chunk, x_chunk
+        else:
+            y_axis = np.concatenate((self._y, y_chunk))
+            x_axis = np.concatenate((self._x, x_chunk))
+
+        offset = self._offset
+        # the scan works on indices local to the buffer
+        index, mode, mx, mxpos, mn, mnpos = self._state
+        state = [index - offset, mode,
+                 mx, None if mxpos is None else mxpos - offset,
+                 mn, None if mnpos is None else mnpos - offset]
+        stop = len(y_axis) - self.lookahead
+        peaks = []
+        if stop > state[0]:
+            wmax = _sliding_extreme(y_axis, self.lookahead, np.maximum)
+            wmin = _sliding_extreme(y_axis, self.lookahead, np.minimum)
+            peaks = _peakdetect_scan(y_axis, wmax, wmin, self.delta, stop,
+                                     state)
+
+        max_peaks = []
+        min_peaks = []
+        for pos, is_max in peaks:
+            if self._first:
+                self._first = False
+                continue
+            if pos < 0:
+                x = self._candidate_x[pos + offset]
+                y = mx if is_max else mn
+            else:
+                x = x_axis[pos]
+                y = y_axis[pos]
+            if is_max:
+                max_peaks.append([x, y])
+            else:
+                min_peaks.append([x, y])
+
+        # keep the candidate values before they leave the buffer
+        keep = state[0]
+        candidate_x = {}
+        for pos in (state[3], state[5]):
+            if pos is not None:
+                candidate_x[pos + offset] = (x_axis[pos] if pos >= 0 else
+                                             self._candidate_x[pos + offset])
+        self._candidate_x = candidate_x
+        self._y = y_axis[keep:].copy()
+        self._x = x_axis[keep:].copy()
+        self._offset = offset + keep
+        index, mode, mx, mxpos, mn, mnpos = state
+        self._state = [index + offset, mode,
+                       mx, None if mxpos is None else mxpos + offset,
+                       mn, None if mnpos is None else mnpos + offset]
+
+        return [max_peaks, min_peaks]
+
+    def flush(self):
+        """
+        End the stream and reset the detector for a new one.
+
+        Like 'peakdetect', no peak is ever confirmed within the last
+        'lookahead' samples of the signal, so the tail can't hold any further
+        peaks and the returned lists are always empty.
+
+
+        return: two empty lists [max_peaks, min_peaks]
+        """
+        self.reset()
+        return [[], []]
+    
+    
+@_profiled("fft_local", _window_samples)
+def _peakdetect_fft_local(index, x_axis, y_axis, points, pad_len, is_max,
+                          workers):
+    """
+    Refines the given peaks by FFT interpolation of a small window around
+    each of them, for the local mode of 'peakdetect_fft'. All the windows are
+    transformed at once.
+    
+    The line through the first and last sample of every window is removed
+    before the FFT and added back after it, so that the periodic extension
+    the FFT assumes is continuous and doesn't ring around the peak.
+    
+    keyword arguments:
+    index -- the sample index of the coarse peaks
+    
+    x_axis -- A numpy array of all the x values
+    
+    y_axis -- A numpy array of all the y values
+    
+    points -- How many samples around every peak should be interpolated
+    
+    pad_len -- see 'peakdetect_fft'
+    
+    is_max -- True for maxima and False for minima
     
+    workers -- see 'peakdetect_fft'
     
-def peakdetect_fft(y_axis, x_axis, pad_len = 20):
+    
+    return: the arrays (x, y) of the refined peaks
+    """
+    from scipy.fft import irfft, rfft
+    x_data, y_data = _peak_windows(x_axis, y_axis, index, points)
+    # the trend in units of the interpolated samples
+    n = points * (pad_len + 1)
+    first = y_data[:, :1]
+    slope = (y_data[:, -1:] - first) / (n - pad_len - 1)
+    trend = first + slope * np.arange(0, n, pad_len + 1)
+    
+    fft_data = rfft(y_data - trend, axis=-1, workers=workers)
+    if points % 2 == 0:
+        # the Nyquist bin is split between the positive and negative
+        # frequencies of the padded spectrum
+        fft_data[:, -1] *= 0.5
+    y_fine = irfft(fft_data, n, axis=-1, workers=workers)
+    y_fine *= n / float(points)
+    y_fine += first + slope * np.arange(n)
+    
+    # the peak is searched for in the middle half of the windows only
+    search = slice(n // 4, n - n // 4)
+    extreme = y_fine[:, search].argmax if is_max else y_fine[:, search].argmin
+    fine_index = extreme(axis=1) + search.start
+    dx = (x_data[:, -1] - x_data[:, 0]) / (points - 1)
+    x = x_data[:, 0] + dx * fine_index / (pad_len + 1)
+    y = y_fine[np.arange(len(fine_index)), fine_index]
+    return x, y
+
+
+@_profiled("peakdetect_fft")
+def peakdetect_fft(y_axis, x_axis=None, pad_len = 20, axis=-1, output="list",
+                   workers=None, mode="global", points=31, dtype=None, x0=0,
+                   dx=None, sample_rate=None):
     """
     Performs a FFT calculation on the data and zero-pads the results to
     increase the time domain resolution after performing the inverse fft and
@@ -237,6 +1483,7 @@ def peakdetect_fft(y_axis, x_axis, pad_len = 20):
     
     Omitting the x_axis is forbidden as it would make the resulting x_axis
     value silly if it was returned as the index 50.234 or similar.
+    A uniformly sampled signal may instead be given by dx or sample_rate.
     
     Will find at least 1 less peak then the 'peakdetect_zero_crossing'
     function, but should result in a more precise value of the peak as
@@ -244,13 +1491,18 @@ def peakdetect_fft(y_axis, x_axis, pad_len = 20):
     minimize spectral leakage by calculating the fft between two zero
     crossings for n amount of signal periods.
     
-    The biggest time eater in this function is the ifft and thereafter it's
-    the 'peakdetect' function which takes only half the time of the ifft.
-    Speed improvements could include to check if 2**n points could be used for
-    fft and ifft or change the 'peakdetect' to the 'peakdetect_zero_crossing',
-    which is maybe 10 times faster than 'peakdetct'. The pro of 'peakdetect'
-    is that it results in one less lost peak. It should also be noted that the
-    time used by the ifft function can change greatly depending on the input.
+    The signal is real, so only the positive half of the spectrum is
+    computed and padded, by 'scipy.fft.rfft' and 'irfft'. The biggest time
+    eater in this function is the irfft and thereafter it's the 'peakdetect'
+    function. The padded length is rounded up to one the FFT handles fast,
+    see 'scipy.fft.next_fast_len'.
+    
+    The whole signal is upsampled by default, which takes about
+    'pad_len + 1' times the memory of the signal. With mode='local' the peaks
+    are first found on the raw samples by 'peakdetect_zero_crossing' and
+    only a window of 'points' samples around each of them is upsampled, so
+    memory grows with the number of peaks instead. All the peaks between
+    the first and last zero crossing are found in this mode.
     
     keyword arguments:
     y_axis -- A list containing the signal over which to find peaks
@@ -260,9 +1512,41 @@ def peakdetect_fft(y_axis, x_axis, pad_len = 20):
     
     pad_len -- By how many times the time resolution should be
         increased by, e.g. 1 doubles the resolution. The amount is rounded up
-        to the nearest 2**n amount
+        to the nearest length with fast FFTs
         (default: 20)
     
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    
+    output -- 'list' for lists of [position, peak_value], or 'array' for
+        structured numpy arrays with the fields 'index' (the sample closest
+        to the interpolated peak), 'x' and 'y'
+        (default: 'list')
+    
+    workers -- number of threads used by the FFTs, see 'scipy.fft.rfft'
+        (default: None)
+    
+    mode -- 'global' to upsample the whole signal or 'local' to only
+        upsample a window around every peak (default: 'global')
+    
+    points -- How many samples around every peak are upsampled in the local
+        mode (default: 31)
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    
+    x0 -- the x value of the first sample when x_axis is omitted
+        (default: 0)
+    
+    dx -- the spacing of the samples of a uniformly sampled signal, used
+        instead of x_axis. Only the x values of the peaks are then computed.
+        (default: None)
+    
+    sample_rate -- used instead of dx to give the positions in seconds
+        (default: None)
+    
     
     return: two lists [max_peaks, min_peaks] containing the positive and
         negative peaks respectively. Each cell of the lists contains a tuple
@@ -270,12 +1554,36 @@ def peakdetect_fft(y_axis, x_axis, pad_len = 20):
         to get the average peak value do: np.mean(max_peaks, 0)[1] on the
         results to unpack one of the lists into x, y coordinates do: 
         x, y = zip(*max_peaks)
+        For 2-D input max_peaks and min_peaks are RaggedPeaks holding the
+        peaks of every channel, or structured arrays with an additional
+        'channel' field for output='array'.
     """
     # check input data
-    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis)
+    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis, axis, dtype, x0, dx,
+                                           sample_rate, True)
+    _datacheck_output(output)
+    if y_axis.ndim > 1:
+        return _per_channel(peakdetect_fft, x_axis, y_axis, pad_len,
+                            output=output, workers=workers, mode=mode,
+                            points=points)
+    if mode == "local":
+        raw_peaks = peakdetect_zero_crossing(y_axis, x_axis, output="array")
+        peaks = []
+        for raw, is_max in zip(raw_peaks, (True, False)):
+            x, y = _peakdetect_fft_local(raw["index"], x_axis, y_axis,
+                                         points, pad_len, is_max, workers)
+            peaks.append(_peak_array(_nearest_index(x_axis, x), x, y)
+                         if output == "array" else
+                         [[x_, y_] for x_, y_ in zip(x, y)])
+        return peaks
+    if mode != "global":
+        raise ValueError("mode must be 'global' or 'local'")
+    from scipy.fft import irfft, next_fast_len, rfft
     zero_indices = zero_crossings(y_axis, window_len = 11)
+    # the smoothing offset may put the first crossing before the signal
+    first_indice = max(zero_indices[0], 0)
     #  select a n amount of periods
-    last_indice = - 1 - (1 - len(zero_indices) & 1)
+    last_indice = zero_indices[- 1 - (1 - len(zero_indices) & 1)]
     ###
     # Calculate the fft between the first and last zero crossing
     # this method could be ignored if the beginning and the end of the signal
@@ -284,34 +1592,42 @@ def peakdetect_fft(y_axis, x_axis, pad_len = 20):
     # not in the rest of the signal
     # this is also unnecessary if the given data is an amount of whole periods
     ###
-    fft_data = fft(y_axis[zero_indices[0]:zero_indices[last_indice]])
-    padd = lambda x, c: x[:len(x) // 2] + [0] * c + x[len(x) // 2:]
-    n = lambda x: int(log(x)/log(2)) + 1
-    # pads to 2**n amount of samples
-    fft_padded = padd(list(fft_data), 2 ** 
-                n(len(fft_data) * pad_len) - len(fft_data))
-    
-    # There is amplitude decrease directly proportional to the sample increase
-    sf = len(fft_padded) / float(len(fft_data))
-    # There might be a leakage giving the result an imaginary component
-    # Return only the real component
-    y_axis_ifft = ifft(fft_padded).real * sf # (pad_len + 1)
-    x_axis_ifft = np.linspace(
-                x_axis[zero_indices[0]], x_axis[zero_indices[last_indice]],
-                len(y_axis_ifft))
+    l = last_indice - first_indice
+    with _stage("fft_interpolation", l):
+        fft_data = rfft(y_axis[first_indice:last_indice], workers=workers)
+        if l % 2 == 0:
+            # the Nyquist bin is split between the positive and negative
+            # frequencies of the padded spectrum
+            fft_data[-1] *= 0.5
+        
+        # irfft pads the spectrum with zeros up to the requested length
+        n = next_fast_len(l * (pad_len + 1), True)
+        # There is amplitude decrease directly proportional to the sample
+        # increase
+        sf = n / float(l)
+        y_axis_ifft = irfft(fft_data, n, workers=workers)
+        y_axis_ifft *= sf
+    # the interpolated samples cover the fft window, which ends one sample
+    # before the last crossing
+    x_axis_ifft = np.linspace(x_axis[first_indice], x_axis[last_indice], n,
+                              endpoint=False)
     # get the peaks to the interpolated waveform
     max_peaks, min_peaks = peakdetect(y_axis_ifft, x_axis_ifft, 500,
-                                    delta = abs(np.diff(y_axis).max() * 2))
+                                    delta = abs(np.diff(y_axis).max() * 2),
+                                    output=output)
     # max_peaks, min_peaks = peakdetect_zero_crossing(y_axis_ifft, x_axis_ifft)
     
-    # store one 20th of a period as waveform data
-    data_len = int(np.diff(zero_indices).mean()) / 10
-    data_len += 1 - data_len & 1
+    if output == "array":
+        for peaks in [max_peaks, min_peaks]:
+            peaks["index"] = _nearest_index(x_axis, peaks["x"])
     
     return [max_peaks, min_peaks]
     
     
-def peakdetect_parabola(y_axis, x_axis, points = 31):
+@_profiled("peakdetect_parabola")
+def peakdetect_parabola(y_axis, x_axis=None, points = 31, axis=-1,
+                        output="list", return_fit=False, dtype=None, x0=0,
+                        dx=None, sample_rate=None):
     """
     Function for detecting local maxima and minima in a signal.
     Discovers peaks by fitting the model function: y = k (x - tau) ** 2 + m
@@ -320,6 +1636,7 @@ def peakdetect_parabola(y_axis, x_axis, points = 31):
     
     Omitting the x_axis is forbidden as it would make the resulting x_axis
     value silly, if it was returned as index 50.234 or similar.
+    A uniformly sampled signal may instead be given by dx or sample_rate.
     
     will find the same amount of peaks as the 'peakdetect_zero_crossing'
     function, but might result in a more precise value of the peak.
@@ -333,6 +1650,33 @@ def peakdetect_parabola(y_axis, x_axis, points = 31):
     points -- How many points around the peak should be used during curve
         fitting (default: 31)
     
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    
+    output -- 'list' for lists of [position, peak_value], or 'array' for
+        structured numpy arrays with the fields 'index' (the raw peak), 'x',
+        'y' and 'a', the curvature of the fitted parabola
+        (default: 'list')
+    
+    return_fit -- also return the fitted parabolas evaluated on a grid of
+        'points * 10' x values over the window of every peak. They are only
+        computed when asked for. (default: False)
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    
+    x0 -- the x value of the first sample when x_axis is omitted
+        (default: 0)
+    
+    dx -- the spacing of the samples of a uniformly sampled signal, used
+        instead of x_axis. Only the x values of the peaks are then computed.
+        (default: None)
+    
+    sample_rate -- used instead of dx to give the positions in seconds
+        (default: None)
+    
     
     return: two lists [max_peaks, min_peaks] containing the positive and
         negative peaks respectively. Each cell of the lists contains a tuple
@@ -340,29 +1684,54 @@ def peakdetect_parabola(y_axis, x_axis, points = 31):
         to get the average peak value do: np.mean(max_peaks, 0)[1] on the
         results to unpack one of the lists into x, y coordinates do: 
         x, y = zip(*max_peaks)
+        For 2-D input max_peaks and min_peaks are RaggedPeaks holding the
+        peaks of every channel, or structured arrays with an additional
+        'channel' field for output='array'.
+        With return_fit [max_peaks, min_peaks, max_fitted, min_fitted] is
+        returned, see '_fitted_waveform' for the format of the fits.
     """
 
     # check input data
-    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis)
+    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis, axis, dtype, x0, dx,
+                                           sample_rate, True)
+    _datacheck_output(output)
+    if y_axis.ndim > 1:
+        return _per_channel(peakdetect_parabola, x_axis, y_axis, points,
+                            output=output, return_fit=return_fit)
     # make the points argument odd
     points += 1 - points % 2
     # points += 1 - int(points) & 1 slower when int conversion needed
     
     # get raw peaks
-    max_raw, min_raw = peakdetect_zero_crossing(y_axis)
+    max_raw, min_raw = peakdetect_zero_crossing(y_axis, x_axis,
+                                                output="array")
     
-    max_ = _peakdetect_parabola_fitter(max_raw, x_axis, y_axis, points)
-    min_ = _peakdetect_parabola_fitter(min_raw, x_axis, y_axis, points)
+    max_ = _peakdetect_parabola_fitter(max_raw["index"], x_axis, y_axis,
+                                       points)
+    min_ = _peakdetect_parabola_fitter(min_raw["index"], x_axis, y_axis,
+                                       points)
     
-    max_peaks = map(lambda x: [x[0], x[1]], max_)
-    # max_fitted = map(lambda x: x[-1], max_)
-    min_peaks = map(lambda x: [x[0], x[1]], min_)
-    # min_fitted = map(lambda x: x[-1], min_)
+    if output == "array":
+        peaks = [_peak_array(raw["index"], tau, c, [("a", a)])
+                 for raw, (tau, c, a) in [(max_raw, max_), (min_raw, min_)]]
+    else:
+        peaks = [[[x, y] for x, y in zip(tau, c)] for tau, c, a in (max_, min_)]
     
-    return [max_peaks, min_peaks]
+    if return_fit:
+        for raw, (tau, c, a) in [(max_raw, max_), (min_raw, min_)]:
+            model = lambda x: (a[:, np.newaxis] *
+                               (x - tau[:, np.newaxis]) ** 2 +
+                               c[:, np.newaxis])
+            peaks.append(_fitted_waveform(x_axis, y_axis, raw["index"],
+                                          points, model, output))
+    
+    return peaks
     
 
-def peakdetect_sine(y_axis, x_axis, points=31, lock_frequency=False):
+@_profiled("peakdetect_sine")
+def peakdetect_sine(y_axis, x_axis=None, points=31, lock_frequency=False,
+                    axis=-1, output="list", return_fit=False, dtype=None,
+                    x0=0, dx=None, sample_rate=None):
     """
     Function for detecting local maxima and minima in a signal.
     Discovers peaks by fitting the model function:
@@ -371,6 +1740,7 @@ def peakdetect_sine(y_axis, x_axis, points=31, lock_frequency=False):
     
     Omitting the x_axis is forbidden as it would make the resulting x_axis
     value silly if it was returned as index 50.234 or similar.
+    A uniformly sampled signal may instead be given by dx or sample_rate.
     
     will find the same amount of peaks as the 'peakdetect_zero_crossing'
     function, but might result in a more precise value of the peak.
@@ -394,6 +1764,33 @@ def peakdetect_sine(y_axis, x_axis, points=31, lock_frequency=False):
         or if optimization process may tinker with it.
         (default: False)
     
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    
+    output -- 'list' for lists of [position, peak_value], or 'array' for
+        structured numpy arrays with the fields 'index' (the raw peak), 'x',
+        'y' and the fitted amplitude 'A' and frequency 'Hz'
+        (default: 'list')
+    
+    return_fit -- also return the fitted sine waves evaluated on a grid of
+        'points * 10' x values over the window of every peak. They are only
+        computed when asked for. (default: False)
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    
+    x0 -- the x value of the first sample when x_axis is omitted
+        (default: 0)
+    
+    dx -- the spacing of the samples of a uniformly sampled signal, used
+        instead of x_axis. Only the x values of the peaks are then computed.
+        (default: None)
+    
+    sample_rate -- used instead of dx to give the positions in seconds
+        (default: None)
+    
     
     return: two lists [max_peaks, min_peaks] containing the positive and
         negative peaks respectively. Each cell of the lists contains a tuple
@@ -401,86 +1798,67 @@ def peakdetect_sine(y_axis, x_axis, points=31, lock_frequency=False):
         to get the average peak value do: np.mean(max_peaks, 0)[1] on the
         results to unpack one of the lists into x, y coordinates do: 
         x, y = zip(*max_peaks)
+        For 2-D input max_peaks and min_peaks are RaggedPeaks holding the
+        peaks of every channel, or structured arrays with an additional
+        'channel' field for output='array'.
+        With return_fit [max_peaks, min_peaks, max_fitted, min_fitted] is
+        returned, see '_fitted_waveform' for the format of the fits.
     """
     # check input data
-    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis)
+    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis, axis, dtype, x0, dx,
+                                           sample_rate, True)
+    _datacheck_output(output)
+    if y_axis.ndim > 1:
+        return _per_channel(peakdetect_sine, x_axis, y_axis, points,
+                            lock_frequency, output=output,
+                            return_fit=return_fit)
     # make the points argument odd
     points += 1 - points % 2
     # points += 1 - int(points) & 1 slower when int conversion needed
     
     # get raw peaks
-    max_raw, min_raw = peakdetect_zero_crossing(y_axis)
+    max_raw, min_raw = peakdetect_zero_crossing(y_axis, x_axis,
+                                                output="array")
     
     # get global offset
-    offset = np.mean([np.mean(max_raw, 0)[1], np.mean(min_raw, 0)[1]])
+    offset = np.mean([max_raw["y"].mean(), min_raw["y"].mean()])
     # fitting a k * x + m function to the peaks might be better
     # offset_func = lambda x, k, m: k * x + m
     
-    # calculate an approximate frequency of the signal
-    Hz_h_peak = np.diff(zip(*max_raw)[0]).mean()
-    Hz_l_peak = np.diff(zip(*min_raw)[0]).mean()
+    # calculate an approximate frequency of the signal in units of the x_axis
+    Hz_h_peak = np.diff(x_axis[max_raw["index"]]).mean()
+    Hz_l_peak = np.diff(x_axis[min_raw["index"]]).mean()
     Hz = 1 / np.mean([Hz_h_peak, Hz_l_peak])
-
-    # model function
-    # if cosine is used then tau could equal the x position of the peak
-    # if sine were to be used then tau would be the first zero crossing
-    if lock_frequency:
-        func = lambda x_ax, A, tau: A * np.sin(
-            2 * pi * Hz * (x_ax - tau) + pi / 2)
-    else:
-        func = lambda x_ax, A, Hz, tau: A * np.sin(
-            2 * pi * Hz * (x_ax - tau) + pi / 2)
-    # func = lambda x_ax, A, Hz, tau: A * np.cos(2 * pi * Hz * (x_ax - tau))
-
+    
     # get peaks
-    fitted_peaks = []
-    for raw_peaks in [max_raw, min_raw]:
-        peak_data = []
-        for peak in raw_peaks:
-            index = peak[0]
-            x_data = x_axis[index - points // 2: index + points // 2 + 1]
-            y_data = y_axis[index - points // 2: index + points // 2 + 1]
-            # get a first approximation of tau (peak position in time)
-            tau = x_axis[index]
-            # get a first approximation of peak amplitude
-            A = peak[1]
-            
-            # build list of approximations
-            if lock_frequency:
-                p0 = (A, tau)
-            else:
-                p0 = (A, Hz, tau)
-            
-            # subtract offset from wave-shape
-            y_data -= offset
-            popt, pcov = curve_fit(func, x_data, y_data, p0)
-            # retrieve tau and A i.e x and y value of peak
-            x = popt[-1]
-            y = popt[0]
-            
-            # create a high resolution data set for the fitted waveform
-            x2 = np.linspace(x_data[0], x_data[-1], points * 10)
-            y2 = func(x2, *popt)
-            
-            # add the offset to the results
-            y += offset
-            y2 += offset
-            y_data += offset
-            
-            peak_data.append([x, y, [x2, y2]])
-       
-        fitted_peaks.append(peak_data)
-    
-    # structure date for output
-    max_peaks = map(lambda x: [x[0], x[1]], fitted_peaks[0])
-    # max_fitted = map(lambda x: x[-1], fitted_peaks[0])
-    min_peaks = map(lambda x: [x[0], x[1]], fitted_peaks[1])
-    # min_fitted = map(lambda x: x[-1], fitted_peaks[1])
+    fitted_peaks = [_peakdetect_sine_fitter(raw["index"], x_axis, y_axis,
+                                            points, offset, Hz,
+                                            lock_frequency)
+                    for raw in (max_raw, min_raw)]
+    
+    # structure date for output, adding the offset to the results
+    if output == "array":
+        peaks = [_peak_array(raw["index"], tau, A + offset,
+                             [("A", A), ("Hz", f)])
+                 for raw, (tau, A, f) in zip([max_raw, min_raw], fitted_peaks)]
+    else:
+        peaks = [[[x, y + offset] for x, y in zip(tau, A)]
+                 for tau, A, f in fitted_peaks]
+    
+    if return_fit:
+        for raw, (tau, A, f) in zip([max_raw, min_raw], fitted_peaks):
+            model = lambda x: (A[:, np.newaxis] * np.cos(
+                2 * pi * f[:, np.newaxis] * (x - tau[:, np.newaxis])) +
+                offset)
+            peaks.append(_fitted_waveform(x_axis, y_axis, raw["index"],
+                                          points, model, output))
 
-    return [max_peaks, min_peaks]
+    return peaks
 
     
-def peakdetect_sine_locked(y_axis, x_axis, points = 31):
+def peakdetect_sine_locked(y_axis, x_axis=None, points = 31, axis=-1,
+                           output="list", return_fit=False, dtype=None, x0=0,
+                           dx=None, sample_rate=None):
     """
     Convenience function for calling the 'peakdetect_sine' function with
     the lock_frequency argument as True.
@@ -491,13 +1869,79 @@ def peakdetect_sine_locked(y_axis, x_axis, points = 31):
         in the return to specify the position of the peaks.
     points -- How many points around the peak should be used during curve
         fitting (default: 31)
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    output -- 'list' or 'array', see 'peakdetect_sine' (default: 'list')
+    return_fit -- also return the fitted sine waves, see 'peakdetect_sine'
+        (default: False)
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    x0, dx, sample_rate -- the uniform x axis used instead of x_axis, see
+        'peakdetect_sine'
     
     return: see the function 'peakdetect_sine'
     """
-    return peakdetect_sine(y_axis, x_axis, points, True)
+    return peakdetect_sine(y_axis, x_axis, points, True, axis, output,
+                           return_fit, dtype, x0, dx, sample_rate)
     
     
-def peakdetect_spline(y_axis, x_axis, pad_len=20):
+@_profiled("spline_extrema", lambda cj, index, is_max: len(index))
+def _spline_extrema(cj, index, is_max):
+    """
+    Finds the extrema of the cubic spline given by 'cspline1d' analytically,
+    for the analytic mode of 'peakdetect_spline'.
+    
+    On every interval between two samples the spline is a cubic polynomial
+    of the four nearest coefficients, so its derivative is a quadratic whose
+    roots are the only possible extrema. The roots in the intervals on either
+    side of every coarse peak, and the samples themselves, are compared and
+    the largest (smallest for minima) is kept.
+    
+    keyword arguments:
+    cj -- the spline coefficients as given by 'cspline1d'
+    
+    index -- the sample index of the coarse peaks
+    
+    is_max -- True for maxima and False for minima
+    
+    
+    return: the arrays (t, y) with the position of every peak in units of
+        samples and the value of the spline there
+    """
+    # the coefficients are clamped at the edges, as in 'cspline1d_eval'
+    c = np.r_[cj[:1], cj, cj[-1:]]
+    j = np.clip(np.asarray(index, np.intp)[:, np.newaxis] + [-1, 0], 0,
+                len(cj) - 2)
+    c0, c1, c2, c3 = [c[j + k, np.newaxis] for k in range(4)]
+    
+    # the derivative a * u ** 2 + b * u + d of the spline for u in [0, 1]
+    a = (-c0 + 3 * c1 - 3 * c2 + c3) / 2
+    b = c0 - 2 * c1 + c2
+    d = (c2 - c0) / 2
+    discriminant = b * b - 4 * a * d
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # numerically stable roots, also for a == 0
+        q = -(b + np.copysign(np.sqrt(discriminant), b)) / 2
+        u = np.concatenate((q / a, d / q), axis=-1)
+    # roots outside the interval are replaced by the sample at its start
+    u[~((u >= 0) & (u <= 1))] = 0
+    
+    y = (c0 * (1 - u) ** 3 + c1 * (3 * u ** 3 - 6 * u ** 2 + 4) +
+         c2 * (-3 * u ** 3 + 3 * u ** 2 + 3 * u + 1) + c3 * u ** 3) / 6
+    t = j[..., np.newaxis] + u
+    y, t = y.reshape(len(j), -1), t.reshape(len(j), -1)
+    best = y.argmax(axis=1) if is_max else y.argmin(axis=1)
+    rows = np.arange(len(j))
+    return t[rows, best], y[rows, best]
+
+
+@_profiled("peakdetect_spline")
+def peakdetect_spline(y_axis, x_axis=None, pad_len=20, axis=-1, output="list",
+                      mode="grid", dtype=None, x0=0, dx=None,
+                      sample_rate=None):
     """
     Performs a b-spline interpolation on the data to increase resolution and
     send the data to the 'peakdetect_zero_crossing' function for peak 
@@ -505,10 +1949,17 @@ def peakdetect_spline(y_axis, x_axis, pad_len=20):
     
     Omitting the x_axis is forbidden as it would make the resulting x_axis
     value silly if it was returned as the index 50.234 or similar.
+    A uniformly sampled signal may instead be given by dx or sample_rate.
     
     will find the same amount of peaks as the 'peakdetect_zero_crossing'
     function, but might result in a more precise value of the peak.
     
+    By default the spline is evaluated on a grid 'pad_len + 1' times denser
+    than the signal. With mode='analytic' the peaks are first found on the
+    raw samples and the exact extremum of the spline next to each of them
+    is solved for instead, see '_spline_extrema', which is both faster and
+    more precise than any grid.
+    
     keyword arguments:
     y_axis -- A list containing the signal over which to find peaks
     
@@ -520,6 +1971,32 @@ def peakdetect_spline(y_axis, x_axis, pad_len=20):
         e.g. 1 doubles the resolution.
         (default: 20)
     
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    
+    output -- 'list' for lists of [position, peak_value], or 'array' for
+        structured numpy arrays with the fields 'index' (the sample closest
+        to the interpolated peak), 'x' and 'y'
+        (default: 'list')
+    
+    mode -- 'grid' to search the spline evaluated on a dense grid or
+        'analytic' to solve for its extrema (default: 'grid')
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    
+    x0 -- the x value of the first sample when x_axis is omitted
+        (default: 0)
+    
+    dx -- the spacing of the samples of a uniformly sampled signal, used
+        instead of x_axis. Only the x values of the peaks are then computed.
+        (default: None)
+    
+    sample_rate -- used instead of dx to give the positions in seconds
+        (default: None)
+    
     
     return: two lists [max_peaks, min_peaks] containing the positive and
         negative peaks respectively. Each cell of the lists contains a tuple
@@ -527,23 +2004,59 @@ def peakdetect_spline(y_axis, x_axis, pad_len=20):
         to get the average peak value do: np.mean(max_peaks, 0)[1] on the
         results to unpack one of the lists into x, y coordinates do: 
         x, y = zip(*max_peaks)
+        For 2-D input max_peaks and min_peaks are RaggedPeaks holding the
+        peaks of every channel, or structured arrays with an additional
+        'channel' field for output='array'.
     """
     # check input data
-    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis)
+    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis, axis, dtype, x0, dx,
+                                           sample_rate, True)
+    _datacheck_output(output)
+    if y_axis.ndim > 1:
+        return _per_channel(peakdetect_spline, x_axis, y_axis, pad_len,
+                            output=output, mode=mode)
+    if mode not in ("grid", "analytic"):
+        raise ValueError("mode must be 'grid' or 'analytic'")
     # could perform a check if x_axis is equally spaced
     # if np.std(np.diff(x_axis)) > 1e-15: raise ValueError
     # perform spline interpolations
-    dx = x_axis[1] - x_axis[0]
+    if isinstance(x_axis, _UniformAxis):
+        dx = x_axis.step
+    else:
+        dx = x_axis[1] - x_axis[0]
+    from scipy.signal import cspline1d, cspline1d_eval
+    with _stage("spline_coefficients", len(y_axis)):
+        cj = cspline1d(y_axis)
+    if mode == "analytic":
+        raw_peaks = peakdetect_zero_crossing(y_axis, x_axis, output="array")
+        peaks = []
+        for raw, is_max in zip(raw_peaks, (True, False)):
+            t, y = _spline_extrema(cj, raw["index"], is_max)
+            x = x_axis[0] + t * dx
+            peaks.append(_peak_array(_nearest_index(x_axis, x), x, y)
+                         if output == "array" else
+                         [[x_, y_] for x_, y_ in zip(x, y)])
+        return peaks
     x_interpolated = np.linspace(x_axis.min(), x_axis.max(), len(x_axis) * (pad_len + 1))
-    cj = cspline1d(y_axis)
-    y_interpolated = cspline1d_eval(cj, x_interpolated, dx=dx,x0=x_axis[0])
+    with _stage("spline_interpolation", len(x_interpolated)):
+        y_interpolated = cspline1d_eval(cj, x_interpolated, dx=dx,
+                                        x0=x_axis[0])
     # get peaks
-    max_peaks, min_peaks = peakdetect_zero_crossing(y_interpolated, x_interpolated)
+    max_peaks, min_peaks = peakdetect_zero_crossing(y_interpolated,
+                                                    x_interpolated,
+                                                    output=output)
+    
+    if output == "array":
+        for peaks in [max_peaks, min_peaks]:
+            peaks["index"] = _nearest_index(x_axis, peaks["x"])
     
     return [max_peaks, min_peaks]
 
 
-def peakdetect_zero_crossing(y_axis, x_axis = None, window = 11):
+@_profiled("peakdetect_zero_crossing")
+def peakdetect_zero_crossing(y_axis, x_axis = None, window = 11, axis=-1,
+                             output="list", workers=None, dtype=None, x0=0,
+                             dx=None, sample_rate=None, backend=None):
     """
     Function for detecting local maxima and minima in a signal.
     Discovers peaks by dividing the signal into bins and retrieving the
@@ -568,6 +2081,39 @@ def peakdetect_zero_crossing(y_axis, x_axis = None, window = 11):
     window -- the dimension of the smoothing window; should be an odd integer
         (default: 11)
     
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    
+    output -- 'list' for lists of [position, peak_value], or 'array' for
+        structured numpy arrays with the fields 'index', 'x' and 'y'
+        (default: 'list')
+    
+    workers -- the amount of threads that segments of the signal are
+        processed in, negative values count back from the amount of CPUs.
+        The peaks are the same for any amount of workers.
+        (default: None, a single thread)
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    
+    x0 -- the x value of the first sample when x_axis is omitted
+        (default: 0)
+    
+    dx -- the spacing of the samples of a uniformly sampled signal, used
+        instead of x_axis. Only the x values of the peaks are then computed.
+        (default: None)
+    
+    sample_rate -- used instead of dx to give the positions in seconds
+        (default: None)
+    
+    backend -- 'numba' to search the bins with a loop compiled by Numba,
+        'numpy' for the vectorized search, or 'auto' for 'numba' whenever
+        Numba is installed. Both give identical results.
+        (default: None, the PEAKDETECT_BACKEND environment variable or else
+        'auto')
+    
     
     return: two lists [max_peaks, min_peaks] containing the positive and
         negative peaks respectively. Each cell of the lists contains a tuple
@@ -575,50 +2121,388 @@ def peakdetect_zero_crossing(y_axis, x_axis = None, window = 11):
         to get the average peak value do: np.mean(max_peaks, 0)[1] on the
         results to unpack one of the lists into x, y coordinates do: 
         x, y = zip(*max_peaks)
+        For 2-D input max_peaks and min_peaks are RaggedPeaks holding the
+        peaks of every channel, or structured arrays with an additional
+        'channel' field for output='array'.
     """
     # check input data
-    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis)
-    
-    zero_indices = zero_crossings(y_axis, window_len = window)
-    period_lengths = np.diff(zero_indices)
-            
-    bins_y = [y_axis[index:index + diff] for index, diff in
-              zip(zero_indices, period_lengths)]
-    bins_x = [x_axis[index:index + diff] for index, diff in
-              zip(zero_indices, period_lengths)]
-        
-    even_bins_y = bins_y[::2]
-    odd_bins_y = bins_y[1::2]
-    even_bins_x = bins_x[::2]
-    odd_bins_x = bins_x[1::2]
-    hi_peaks_x = []
-    lo_peaks_x = []
-    
-    # check if even bin contains maxima
-    if abs(even_bins_y[0].max()) > abs(even_bins_y[0].min()):
-        hi_peaks = [bin.max() for bin in even_bins_y]
-        lo_peaks = [bin.min() for bin in odd_bins_y]
-        # get x values for peak
-        for bin_x, bin_y, peak in zip(even_bins_x, even_bins_y, hi_peaks):
-            hi_peaks_x.append(bin_x[np.where(bin_y==peak)[0][0]])
-        for bin_x, bin_y, peak in zip(odd_bins_x, odd_bins_y, lo_peaks):
-            lo_peaks_x.append(bin_x[np.where(bin_y==peak)[0][0]])
+    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis, axis, dtype, x0, dx,
+                                           sample_rate)
+    _datacheck_output(output)
+    workers = _datacheck_workers(workers)
+    find_bins = _datacheck_backend(backend)["zero_crossing_bins"]
+    
+    # the zero crossings of all channels are found in one pass
+    zero_indices = zero_crossings(y_axis, window_len = window,
+                                  workers=workers)
+    if y_axis.ndim > 1:
+        channel, index, is_max = find_bins(y_axis, zero_indices)
+        return [_format_channel_peaks(x_axis, y_axis, channel[select],
+                                      index[select], output)
+                for select in (is_max, ~is_max)]
+
+    if workers > 1:
+        channel, index, is_max = _peakdetect_zero_crossing_segmented(
+            y_axis, zero_indices, workers, find_bins)
     else:
-        hi_peaks = [bin.max() for bin in odd_bins_y]
-        lo_peaks = [bin.min() for bin in even_bins_y]
-        # get x values for peak
-        for bin_x, bin_y, peak in zip(odd_bins_x, odd_bins_y, hi_peaks):
-            hi_peaks_x.append(bin_x[np.where(bin_y==peak)[0][0]])
-        for bin_x, bin_y, peak in zip(even_bins_x, even_bins_y, lo_peaks):
-            lo_peaks_x.append(bin_x[np.where(bin_y==peak)[0][0]])
+        channel, index, is_max = find_bins(y_axis[np.newaxis],
+                                           [zero_indices])
+    return [_format_peaks(x_axis, y_axis, index[is_max], output),
+            _format_peaks(x_axis, y_axis, index[~is_max], output)]
+
+
+@_profiled("zero_crossing_bins")
+def _peakdetect_zero_crossing(y_axis, zero_indices, even_max=None):
+    """
+    Bins the signal between the given zero crossings and finds the peak of
+    every bin for 'peakdetect_zero_crossing'.
+
+    The bins of all channels are reduced at once: the channels are laid end
+    to end, the extremes of every bin found with 'reduceat' and the first
+    sample equal to the extreme of its bin taken as the peak, which is what
+    argmax/argmin would give per bin.
+
+    keyword arguments:
+    y_axis -- A 2-D numpy array with one channel per row
+
+    zero_indices -- the zero crossings of every channel as given by
+        'zero_crossings'
+
+    even_max -- whether the even bins of every channel hold maxima, which is
+        found from the first bin of every channel when None (default: None)
+
+
+    return: the arrays (channel, index, is_max) describing the peak of every
+        bin, ordered by channel and position
+    """
+    n = y_axis.shape[-1]
+    # the smoothing offset may put the first crossing before the signal
+    zero_indices = [np.maximum(indices, 0) for indices in zero_indices]
+    counts = np.array([max(len(indices) - 1, 0) for indices in zero_indices],
+                      np.intp)
+    channel = np.repeat(np.arange(len(zero_indices)), counts)
+    if not len(channel):
+        return channel, channel.copy(), np.zeros(0, bool)
+    
+    # every crossing starts a segment of the flattened signal: a bin, or the
+    # gap from the last crossing of a channel to the first of the next one
+    bounds = np.concatenate([indices + c * n for c, indices in
+                             enumerate(zero_indices) if len(indices) > 1])
+    if (np.diff(bounds) < 1).any():
+        raise ValueError("Empty bin between zero crossings")
+    found = counts > 0
+    is_bin = np.ones(len(bounds), bool)
+    is_bin[np.cumsum(counts[found] + 1) - 1] = False
+    start = bounds[0]
+    flat_y = np.ascontiguousarray(y_axis).reshape(-1)[start:]
+    bounds -= start
+    lengths = np.diff(np.append(bounds, len(flat_y)))
+    seg_max = np.maximum.reduceat(flat_y, bounds)
+    seg_min = np.minimum.reduceat(flat_y, bounds)
+    bin_max, bin_min = seg_max[is_bin], seg_min[is_bin]
+    
+    # check if the even bins of each channel contain maxima
+    first_bin = np.cumsum(counts) - counts
+    if even_max is None:
+        even_max = np.zeros(len(counts), bool)
+        even_max[found] = (abs(bin_max[first_bin[found]]) >
+                           abs(bin_min[first_bin[found]]))
+    is_even = (np.arange(len(channel)) - np.repeat(first_bin, counts)) % 2 == 0
+    is_max = is_even == np.repeat(even_max, counts)
+    
+    # get the first index of the peak in every bin, the first match at or
+    # after the start of a bin always lies within it
+    peak_y = seg_max.copy()
+    peak_y[is_bin] = np.where(is_max, bin_max, bin_min)
+    hits = np.flatnonzero(flat_y == np.repeat(peak_y, lengths))
+    index = hits[np.searchsorted(hits, bounds[is_bin])] + start - channel * n
+    
+    return channel, index, is_max
+        
+    
+def _peakdetect_zero_crossing_segmented(y_axis, zero_indices, workers,
+                                        find_bins=None):
+    """
+    Parallel version of '_peakdetect_zero_crossing', or of the 'find_bins'
+    kernel of another backend, for a 1-D y_axis.
     
-    max_peaks = [[x, y] for x,y in zip(hi_peaks_x, hi_peaks)]
-    min_peaks = [[x, y] for x,y in zip(lo_peaks_x, lo_peaks)]
+    The bins are split into groups at zero crossings, so no bin is ever cut,
+    and every group starts at an even bin with the kind of its even bins
+    taken from the first bin of the signal. The peaks are the same as those
+    of a single '_peakdetect_zero_crossing' call.
     
-    return [max_peaks, min_peaks]
+    return: the arrays (channel, index, is_max) like
+        '_peakdetect_zero_crossing'
+    """
+    zero_indices = np.maximum(zero_indices, 0)
+    bins = len(zero_indices) - 1
+    if find_bins is None:
+        find_bins = _peakdetect_zero_crossing
+    if bins < 2 or (np.diff(zero_indices) < 1).any():
+        return find_bins(y_axis[np.newaxis], [zero_indices])
+    
+    first = y_axis[zero_indices[0]:zero_indices[1]]
+    even_max = [abs(first.max()) > abs(first.min())]
+    splits = np.unique(np.append(
+        np.linspace(0, bins, 4 * workers + 1).astype(np.intp) // 2 * 2, bins))
+    
+    def group(i):
+        start, stop = splits[i], splits[i + 1]
+        offset = zero_indices[start]
+        # the sample after the last crossing keeps it inside the signal
+        channel, index, is_max = find_bins(
+            y_axis[np.newaxis, offset:zero_indices[stop] + 1],
+            [zero_indices[start:stop + 1] - offset], even_max)
+        return channel, index + offset, is_max
+    
+    return tuple(np.concatenate(arrays) for arrays in
+                 zip(*_thread_map(group, range(len(splits) - 1), workers)))
+        
+    
+# the kernels compiled by Numba, by kernel function
+_JIT = {}
+
+
+def _jit(kernel):
+    """
+    Compiles one of the loop kernels with Numba on first use. The machine
+    code is cached on disk next to the module, or in NUMBA_CACHE_DIR, so
+    other processes, e.g. the workers of 'batch', load it instead of
+    compiling it again.
+    
+    return: the compiled kernel
+    """
+    try:
+        return _JIT[kernel]
+    except KeyError:
+        import numba
+        compiled = _JIT[kernel] = numba.njit(cache=True, nogil=True)(kernel)
+        return compiled
+
+
+def _peakdetect_kernel(y_axis, lookahead, delta):
+    """
+    The loop of '_peakdetect_python' on arrays only, to be compiled by
+    Numba.
+    
+    A failed look ahead finds the first sample that is at least as large as
+    the maximum candidate, or as small as the minimum one, or NaN, and the
+    look ahead is not repeated before that sample while the candidate stays
+    the same, as it would fail again. This keeps the loop linear in the
+    signal length.
+    
+    return: the arrays (position, is_max) of every peak found
+    """
+    length = len(y_axis)
+    position = np.empty(16, np.int64)
+    kind = np.empty(16, np.bool_)
+    count = 0
+    mn, mx = np.inf, -np.inf
+    mnpos, mxpos = 0, 0
+    # the first index at which the look ahead of the candidate may succeed
+    mn_next, mx_next = 0, 0
+    for index in range(length - lookahead):
+        y = y_axis[index]
+        if y > mx:
+            mx = y
+            mxpos = index
+            mx_next = 0
+        if y < mn:
+            mn = y
+            mnpos = index
+            mn_next = 0
+        
+        # look for max
+        if y < mx - delta and mx != np.inf and index >= mx_next:
+            mx_next = index + lookahead
+            for ahead in range(index, index + lookahead):
+                # a NaN fails the look ahead, like it does in max()
+                if not y_axis[ahead] < mx:
+                    mx_next = ahead
+                    break
+            if mx_next == index + lookahead:
+                if count == len(position):
+                    position = np.concatenate((position, position))
+                    kind = np.concatenate((kind, kind))
+                position[count] = mxpos
+                kind[count] = True
+                count += 1
+                mx = np.inf
+                mn = np.inf
+                mx_next = mn_next = 0
+                continue
         
+        # look for min
+        if y > mn + delta and mn != -np.inf and index >= mn_next:
+            mn_next = index + lookahead
+            for ahead in range(index, index + lookahead):
+                if not y_axis[ahead] > mn:
+                    mn_next = ahead
+                    break
+            if mn_next == index + lookahead:
+                if count == len(position):
+                    position = np.concatenate((position, position))
+                    kind = np.concatenate((kind, kind))
+                position[count] = mnpos
+                kind[count] = False
+                count += 1
+                mn = -np.inf
+                mx = -np.inf
+                mx_next = mn_next = 0
+    
+    return position[:count], kind[:count]
+
+
+@_profiled("peakdetect_numba")
+def _peakdetect_numba(y_axis, lookahead, delta):
+    """
+    Numba backend of the 'numpy' engine of 'peakdetect'
+    
+    return: list of (index, is_max) for every peak found, one such list per
+        channel for 2-D data
+    """
+    if y_axis.ndim > 1:
+        return [_peakdetect_numba(y, lookahead, delta) for y in y_axis]
+    position, is_max = _jit(_peakdetect_kernel)(y_axis, lookahead, delta)
+    return list(zip(position.tolist(), is_max.tolist()))
+
+
+def _zero_crossing_bins_kernel(y_axis, zero_indices, even_max):
+    """
+    Finds the peak of every bin between the zero crossings of a single
+    channel, to be compiled by Numba
+    
+    return: the arrays (index, is_max) of the peak of every bin
+    """
+    bins = len(zero_indices) - 1
+    index = np.empty(bins, np.int64)
+    is_max = np.empty(bins, np.bool_)
+    for i in range(bins):
+        find_max = (i % 2 == 0) == even_max
+        peak = zero_indices[i]
+        for j in range(peak + 1, zero_indices[i + 1]):
+            if find_max:
+                if y_axis[j] > y_axis[peak]:
+                    peak = j
+            elif y_axis[j] < y_axis[peak]:
+                peak = j
+        index[i] = peak
+        is_max[i] = find_max
+    return index, is_max
+
+
+@_profiled("zero_crossing_bins")
+def _peakdetect_zero_crossing_numba(y_axis, zero_indices, even_max=None):
+    """
+    Numba backend of '_peakdetect_zero_crossing', the bins are searched one
+    channel at a time
+    
+    return: the arrays (channel, index, is_max) describing the peak of every
+        bin, ordered by channel and position
+    """
+    kernel = _jit(_zero_crossing_bins_kernel)
+    channels, indices, kinds = [], [], []
+    for c, (y, crossings) in enumerate(zip(y_axis, zero_indices)):
+        # the smoothing offset may put the first crossing before the signal
+        crossings = np.maximum(crossings, 0).astype(np.int64)
+        if len(crossings) < 2:
+            continue
+        if (np.diff(crossings) < 1).any():
+            raise ValueError("Empty bin between zero crossings")
+        if even_max is None:
+            first = y[crossings[0]:crossings[1]]
+            channel_even_max = bool(abs(first.max()) > abs(first.min()))
+        else:
+            channel_even_max = bool(even_max[c])
+        index, is_max = kernel(y, crossings, channel_even_max)
+        channels.append(np.full(len(index), c, np.intp))
+        indices.append(index.astype(np.intp))
+        kinds.append(is_max)
+    if not channels:
+        return np.zeros(0, np.intp), np.zeros(0, np.intp), np.zeros(0, bool)
+    return (np.concatenate(channels), np.concatenate(indices),
+            np.concatenate(kinds))
+
+
+# the implementations of the kernels that loop over every sample, by backend
+_BACKENDS = {
+    "numpy": {
+        "peakdetect": _peakdetect_numpy,
+        "zero_crossing_bins": _peakdetect_zero_crossing
+        },
+    "numba": {
+        "peakdetect": _peakdetect_numba,
+        "zero_crossing_bins": _peakdetect_zero_crossing_numba
+        }
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_installed():
+    import importlib.util
+    return importlib.util.find_spec("numba") is not None
+
+
+def _datacheck_backend(backend):
+    """
+    Resolves the backend given to a detector. None takes it from the
+    PEAKDETECT_BACKEND environment variable, and 'auto' picks 'numba' when
+    Numba is installed and 'numpy' otherwise.
     
-def _smooth(x, window_len=11, window="hanning"):
+    return: the kernels of the backend from '_BACKENDS'
+    """
+    if backend is None:
+        backend = os.environ.get("PEAKDETECT_BACKEND", "auto") or "auto"
+    if backend == "auto":
+        backend = "numba" if _numba_installed() else "numpy"
+    if backend not in _BACKENDS:
+        raise ValueError("backend must be 'auto' or one of {0}".format(
+            ", ".join(sorted(_BACKENDS))))
+    if backend == "numba" and not _numba_installed():
+        raise ImportError("the 'numba' backend requires Numba to be "
+                          "installed")
+    return _BACKENDS[backend]
+
+
+# normalised smoothing windows by (name, length)
+_SMOOTH_WINDOWS = {}
+
+# windows at least this long are convolved through the FFT
+_SMOOTH_FFT_LEN = 256
+
+# long signals are smoothed and searched for zero crossings in blocks of this
+# many samples, on a grid fixed by the signal alone so that the result is the
+# same for any amount of workers
+_SMOOTH_BLOCK = 1 << 20
+
+
+def _convolve_window(s, w, window):
+    """
+    Convolves the last axis of s with the normalised window w, keeping only
+    the fully overlapping part like np.convolve(w, s, mode="valid").
+
+    The flat window is a moving average computed from a running sum in O(n),
+    long windows use overlap-add FFT convolution and short ones are
+    convolved directly.
+    """
+    window_len = len(w)
+    if window == "flat":
+        c = np.zeros(s.shape[:-1] + (s.shape[-1] + 1,))
+        np.cumsum(s, axis=-1, out=c[..., 1:])
+        return (c[..., window_len:] - c[..., :-window_len]) / window_len
+    if window_len >= _SMOOTH_FFT_LEN:
+        from scipy.signal import oaconvolve
+        return oaconvolve(s, w.reshape((1,) * (s.ndim - 1) + (-1,)),
+                          mode="valid", axes=-1)
+    if s.ndim > 1:
+        # all channels are convolved at once through a strided view
+        windows = np.lib.stride_tricks.sliding_window_view(s, window_len, -1)
+        return windows.dot(w[::-1])
+    return np.convolve(w, s, mode="valid")
+
+
+@_profiled("smooth")
+def _smooth(x, window_len=11, window="hanning", workers=1):
     """
     smooth the data using a window of the requested size.
     
@@ -628,7 +2512,7 @@ def _smooth(x, window_len=11, window="hanning"):
     in the beginning and end part of the output signal.
     
     keyword arguments:
-    x -- the input signal 
+    x -- the input signal, 2-D arrays are smoothed along the last axis
     
     window_len -- the dimension of the smoothing window; should be an odd
         integer (default: 11)
@@ -636,6 +2520,9 @@ def _smooth(x, window_len=11, window="hanning"):
     window -- the type of window from 'flat', 'hanning', 'hamming', 
         'bartlett', 'blackman', where flat is a moving average
         (default: 'hanning')
+    
+    workers -- the amount of threads that blocks of the signal are smoothed
+        in (default: 1)
 
     
     return: the smoothed signal
@@ -652,14 +2539,48 @@ def _smooth(x, window_len=11, window="hanning"):
     numpy.convolve, scipy.signal.lfilter 
     """
 
-    if x.ndim != 1:
-        raise ValueError("smooth only accepts 1 dimension arrays.")
+    if x.ndim not in (1, 2):
+        raise ValueError("smooth only accepts 1 or 2 dimension arrays.")
 
-    if x.size < window_len:
+    if x.shape[-1] < window_len:
         raise ValueError("Input vector needs to be bigger than window size.")
     
     if window_len<3:
         return x
+    w = _smooth_window(window, window_len)
+    
+    # the signal is not copied into a padded buffer: only the edges, which
+    # see the reflected copies, are convolved separately
+    n = x.shape[-1]
+    head = np.concatenate((x[..., window_len-1:0:-1], x[..., :window_len-1]),
+                          axis=-1)
+    tail = np.concatenate((x[..., n-window_len+1:], x[..., -1:-window_len:-1]),
+                          axis=-1)
+    y = np.empty(x.shape[:-1] + (n + window_len - 1,),
+                 np.result_type(x.dtype, w.dtype))
+    y[..., :window_len-1] = _convolve_window(head, w, window)
+    y[..., n:] = _convolve_window(tail, w, window)
+    middle = y[..., window_len-1:n]
+    
+    def convolve(start):
+        stop = min(start + _SMOOTH_BLOCK, middle.shape[-1])
+        middle[..., start:stop] = _convolve_window(
+            x[..., start:stop + window_len - 1], w, window)
+    
+    _thread_map(convolve, range(0, middle.shape[-1], _SMOOTH_BLOCK), workers)
+    
+    return y
+    
+    
+def _smooth_window(window, window_len):
+    """
+    return: the normalised smoothing window of the given type and length,
+        see '_smooth'
+    """
+    try:
+        return _SMOOTH_WINDOWS[window, window_len]
+    except KeyError:
+        pass
     # declare valid windows in a dictionary
     window_funcs = {
         "flat": lambda _len: np.ones(_len, "d"),
@@ -669,21 +2590,23 @@ def _smooth(x, window_len=11, window="hanning"):
         "blackman": np.blackman
         }
     
-    s = np.r_[x[window_len-1:0:-1], x, x[-1:-window_len:-1]]
     try:
         w = window_funcs[window](window_len)
     except KeyError:
         raise ValueError(
             "Window is not one of '{0}', '{1}', '{2}', '{3}', '{4}'".format(
             *window_funcs.keys()))
-    
-    y = np.convolve(w / w.sum(), s, mode = "valid")
-    
-    return y
+    w = w / w.sum()
+    # the cached window is shared by all callers
+    w.flags.writeable = False
+    _SMOOTH_WINDOWS[window, window_len] = w
+    return w
     
     
+@_profiled("zero_crossings")
 def zero_crossings(y_axis, window_len = 11,
-                   window_f="hanning", offset_corrected=False):
+                   window_f="hanning", offset_corrected=False, axis=-1,
+                   workers=None):
     """
     Algorithm to find zero crossings. Smooths the curve and finds the
     zero-crossings by looking for a sign change.
@@ -700,16 +2623,63 @@ def zero_crossings(y_axis, window_len = 11,
     
     offset_corrected -- Used for recursive calling to remove offset when needed
     
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
     
-    return: the index for each zero-crossing
+    workers -- the amount of threads that blocks of the signal are smoothed
+        and searched in, negative values count back from the amount of CPUs.
+        The zero-crossings are the same for any amount of workers.
+        (default: None, a single thread)
+    
+    
+    return: the index for each zero-crossing. For 2-D input a list with the
+        indices of every channel.
     """
+    workers = _datacheck_workers(workers)
+    if np.ndim(y_axis) > 1:
+        y_axis = np.moveaxis(np.asarray(y_axis), axis, -1)
+        length = y_axis.shape[-1]
+        # smooth all channels and find their sign changes in one pass
+        y_axis = _smooth(y_axis, window_len, window_f, workers)[:, :length]
+        channels, indices = np.nonzero(np.diff(np.sign(y_axis), axis=-1))
+        bounds = np.searchsorted(channels, np.arange(len(y_axis) + 1))
+        return [_zero_crossings_check(y, indices[start:stop], window_len,
+                                      window_f, offset_corrected, workers)
+                for y, start, stop in zip(y_axis, bounds[:-1], bounds[1:])]
+    
     # smooth the curve
     length = len(y_axis)
     
     # discard tail of smoothed signal
-    y_axis = _smooth(y_axis, window_len, window_f)[:length]
-    indices = np.where(np.diff(np.sign(y_axis)))[0]
+    y_axis = _smooth(y_axis, window_len, window_f, workers)[:length]
+    indices = _sign_changes(y_axis, workers)
+    
+    return _zero_crossings_check(y_axis, indices, window_len, window_f,
+                                 offset_corrected, workers)
+
+
+@_profiled("sign_changes")
+def _sign_changes(y_axis, workers):
+    """
+    Finds every index i where the sign of the 1-D y_axis changes from i to
+    i + 1, searching blocks of the signal in parallel
+    """
+    def search(start):
+        block = y_axis[start:start + _SMOOTH_BLOCK + 1]
+        return np.flatnonzero(np.diff(np.sign(block))) + start
+    
+    starts = range(0, max(len(y_axis) - 1, 1), _SMOOTH_BLOCK)
+    return np.concatenate(_thread_map(search, starts, workers))
+
+
+def _zero_crossings_check(y_axis, indices, window_len, window_f,
+                          offset_corrected, workers=1):
+    """
+    Validates the zero crossings found in the smoothed signal y_axis for
+    'zero_crossings', retrying once with the offset removed if needed.
     
+    return: the index for each zero-crossing
+    """
     # check if zero-crossings are valid
     diff = np.diff(indices)
     if diff.std() / diff.mean() > 0.1:
@@ -719,7 +2689,8 @@ def zero_crossings(y_axis, window_len = 11,
         not offset_corrected):
             # offset present attempt to correct by subtracting the average
             offset = np.mean([y_axis.max(), y_axis.min()])
-            return zero_crossings(y_axis-offset, window_len, window_f, True)
+            return zero_crossings(y_axis-offset, window_len, window_f, True,
+                                  workers=workers)
         # Invalid zero crossings and the offset has been removed
         print(diff.std() / diff.mean())
         print(np.diff(indices))
@@ -746,7 +2717,108 @@ def zero_crossings(y_axis, window_len = 11,
 #    return 1.0 / time_p_period
 
 
-def zero_crossings_sine_fit(y_axis, x_axis, fit_window=None, smooth_window=11):
+class ZeroCrossingTracker(object):
+    """
+    Streaming version of the 'zero_crossings' function for signals that
+    arrive in chunks, e.g. when following the mains frequency continuously.
+
+    The smoothing is causal apart from the reflection at the very start of
+    the signal, so only the last 'window_len - 1' samples and the sign of the
+    last smoothed sample are kept between chunks. The crossings are given in
+    global sample coordinates and are identical to those 'zero_crossings'
+    finds in the concatenated signal, regardless of how it is chunked. The
+    running sum of the flat window and the FFT convolution of long windows
+    round differently per chunk, which can only matter for a smoothed
+    sample within rounding error of zero.
+
+    Unlike 'zero_crossings' no offset is removed and the crossings aren't
+    checked for regularity, as that needs the whole signal; a signal with a
+    large offset should be centred before it is pushed.
+
+    example:
+
+    tracker = ZeroCrossingTracker(window_len=11)
+    for chunk in stream:
+        indices = tracker.push(chunk)
+
+    keyword arguments:
+    window_len -- the dimension of the smoothing window; should be an odd
+        integer (default: 11)
+
+    window_f -- the type of window from 'flat', 'hanning', 'hamming',
+        'bartlett', 'blackman' (default: 'hanning')
+    """
+
+    def __init__(self, window_len=11, window_f="hanning"):
+        self.window_len = window_len
+        self.window_f = window_f
+        # short windows leave the signal as it is, see '_smooth'
+        self._window = (_smooth_window(window_f, window_len)
+                        if window_len >= 3 else None)
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all samples and start over as if newly created
+        """
+        # global index of the next sample to be smoothed
+        self._offset = 0
+        # samples not smoothed yet, until a full window has been seen
+        self._pending = None
+        # the last 'window_len - 1' samples, the tail of the convolution
+        self._tail = None
+        # sign of the last smoothed sample
+        self._sign = None
+
+    def push(self, y_chunk):
+        """
+        Feed the next chunk of the signal to the tracker.
+
+        keyword arguments:
+        y_chunk -- The next samples of the signal
+
+
+        return: the global index of each zero-crossing found in this chunk,
+            in the same coordinates as 'zero_crossings'
+        """
+        y_chunk = np.asarray(y_chunk)
+        if y_chunk.ndim != 1:
+            raise ValueError("y_chunk must be a 1-D array")
+        window_len = self.window_len
+        if self._tail is None:
+            if self._pending is not None:
+                y_chunk = np.concatenate((self._pending, y_chunk))
+            if len(y_chunk) < window_len:
+                # the reflection at the start needs a full window
+                self._pending = y_chunk
+                return np.zeros(0, np.intp)
+            self._pending = None
+            self._tail = y_chunk[window_len-1:0:-1]
+
+        if window_len < 3:
+            y = y_chunk
+        else:
+            s = np.concatenate((self._tail, y_chunk))
+            y = _convolve_window(s, self._window, self.window_f)
+            self._tail = s[len(s) - (window_len - 1):].copy()
+
+        sign = np.sign(y)
+        if self._sign is None:
+            indices = np.where(np.diff(sign))[0]
+        else:
+            indices = np.where(np.diff(np.r_[self._sign, sign]))[0] - 1
+        if len(sign):
+            self._sign = sign[-1]
+        indices += self._offset
+        self._offset += len(y)
+        # remove offset from indices due to filter function
+        return indices - (window_len // 2 - 1)
+    
+    
+@_profiled("zero_crossings_sine_fit")
+def zero_crossings_sine_fit(y_axis, x_axis=None, fit_window=None,
+                            smooth_window=11, axis=-1, dtype=None, x0=0,
+                            dx=None, sample_rate=None):
     """
     Detects the zero crossings of a signal by fitting a sine model function
     around the zero crossings:
@@ -757,10 +2829,15 @@ def zero_crossings_sine_fit(y_axis, x_axis, fit_window=None, smooth_window=11):
     function the negative respective positive raw peaks of the wave-shape and
     the amplitude is calculated using data from the offset calculation i.e.
     the 'm' constant from the negative peaks is subtracted from the positive
-    one to obtain amplitude.
+    one to obtain twice the amplitude.
     
     Frequency is calculated using the mean time between raw peaks.
     
+    All the crossings are refined at once by '_gauss_newton', with the
+    windows of falling crossings mirrored to rise like the model. Crossings
+    whose fit doesn't converge, or lands outside its window, are left at the
+    zero crossing of the smoothed signal.
+    
     Algorithm seems to be sensitive to first guess e.g. a large smooth_window
     will give an error in the results.
     
@@ -780,70 +2857,463 @@ def zero_crossings_sine_fit(y_axis, x_axis, fit_window=None, smooth_window=11):
     smooth_window -- the dimension of the smoothing window; should be an odd
         integer (default: 11)
     
+    axis -- the axis holding the samples when y_axis is a 2-D array of
+        several channels (default: -1)
+    
+    dtype -- the dtype y_axis is converted to for the computation, e.g.
+        np.float64 for more precision with float32 samples. When None the
+        samples are used in their own dtype, without a copy.
+        (default: None)
+    
+    x0 -- the x value of the first sample when x_axis is omitted
+        (default: 0)
+    
+    dx -- the spacing of the samples of a uniformly sampled signal, used
+        instead of x_axis. Only the x values of the peaks are then computed.
+        (default: None)
+    
+    sample_rate -- used instead of dx to give the positions in seconds
+        (default: None)
+    
     
     return: A list containing the positions of all the zero crossings.
+        For 2-D input a list with the zero crossings of every channel.
     """
 
     # check input data
-    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis)
+    x_axis, y_axis = _datacheck_peakdetect(x_axis, y_axis, axis, dtype, x0, dx,
+                                           sample_rate)
+    if y_axis.ndim > 1:
+        return [zero_crossings_sine_fit(y, x_axis, fit_window, smooth_window)
+                for y in y_axis]
     # get first guess
     zero_indices = zero_crossings(y_axis, window_len = smooth_window)
     # modify fit_window to show distance per direction
-    if fit_window:
-        fit_window = np.diff(zero_indices).mean() // 3
+    if fit_window is None:
+        fit_window = int(np.diff(zero_indices).mean() // 3)
     else:
         fit_window = fit_window // 2
     
+    # the smoothing offset may put the first crossing before the signal
+    zero_indices = np.clip(zero_indices, 0, len(y_axis) - 1)
     # x_axis is a np array, use the indices to get a subset with zero crossings
     approx_crossings = x_axis[zero_indices]
 
-    # get raw peaks for calculation of offsets and frequency
-    raw_peaks = peakdetect_zero_crossing(y_axis, x_axis)
+    # get raw peaks for calculation of offsets and frequency, reusing the
+    # zero crossings found above
+    channel, index, is_max = _peakdetect_zero_crossing(y_axis[np.newaxis],
+                                                       [zero_indices])
+    raw_peaks = [index[is_max], index[~is_max]]
     # Use mean time between peaks for frequency
-    ext = lambda x: list(zip(*x)[0])
-    _diff = map(np.diff, map(ext, raw_peaks))
-    
-    Hz = 1 / np.mean(map(np.mean, _diff))
+    Hz = 1 / np.mean([np.diff(x_axis[peaks]).mean() for peaks in raw_peaks])
     # Hz = 1 / np.diff(approx_crossings).mean() #probably bad precision
     
-    # offset model function
-    offset_func = lambda x, k, m: k * x + m
-    k = []
-    m = []
-    amplitude = []
-    
-    for peaks in raw_peaks:
-        # get peak data as nparray
-        x_data, y_data = map(np.asarray, zip(*peaks))
-        # x_data = np.asarray(x_data)
-        # y_data = np.asarray(y_data)
-        # calc first guess
-        A = np.mean(y_data)
-        p0 = (0, A)
-        popt, pcov = curve_fit(offset_func, x_data, y_data, p0)
-        # append results
-        k.append(popt[0])
-        m.append(popt[1])
-        amplitude.append(abs(A))
+    # offset model function, y = k * x + m fitted to the maxima respective
+    # minima by linear least squares
+    k, m = np.array([np.polyfit(x_axis[peaks], y_axis[peaks], 1)
+                     for peaks in raw_peaks]).T
     
     # store offset constants
     p_offset = (np.mean(k), np.mean(m))
-    A = m[0] - m[1]
+    # half the distance between the lines through the maxima and minima
+    A = (m[0] - m[1]) / 2
+    
     # define model function to fit to zero crossing
     # y = A * sin(2*pi * Hz * (x - tau)) + k * x + m
-    func = lambda x, tau: A * np.sin(2 * pi * Hz * (x - tau)) + offset_func(x, *p_offset)
-
-    # get true crossings
-    true_crossings = []
-    for indice, crossing in zip(zero_indices, approx_crossings):
-        p0 = (crossing, )
-        subset_start = max(indice - fit_window, 0.0)
-        subset_end = min(indice + fit_window + 1, len(x_axis) - 1.0)
-        x_subset = np.asarray(x_axis[subset_start:subset_end])
-        y_subset = np.asarray(y_axis[subset_start:subset_end])
-        # fit
-        popt, pcov = curve_fit(func, x_subset, y_subset, p0)
+    # the windows of falling crossings are mirrored to rise like the model
+    x_data, y_data = _peak_windows(x_axis, y_axis, zero_indices,
+                                   2 * fit_window + 1)
+    y_data = y_data - (p_offset[0] * x_data + p_offset[1])
+    x_mid = x_data.mean(axis=1, keepdims=True)
+    falling = ((x_data - x_mid) * y_data).sum(axis=1) < 0
+    y_data[falling] *= -1
+    
+    def func(x, tau):
+        return A * np.sin(2 * pi * Hz * (x - tau))
+    
+    def jac(x, tau):
+        d_tau = -A * np.cos(2 * pi * Hz * (x - tau)) * 2 * pi * Hz
+        return d_tau[..., np.newaxis]
+    
+    # get true crossings, all of them refined at once
+    popt, converged = _gauss_newton(func, jac, x_data, y_data,
+                                    approx_crossings[:, np.newaxis])
+    crossings = popt[:, 0]
+    # a failed fit keeps the crossing of the smoothed signal
+    failed = ~(converged & (crossings >= x_data[:, 0]) &
+               (crossings <= x_data[:, -1]))
+    crossings[failed] = approx_crossings[failed]
+    
+    return list(crossings)
+    
+    
+def _stream_peakdetect(chunks, lookahead=200, delta=0):
+    """
+    Chunked 'peakdetect' for 'peakdetect_file', through 'PeakDetector'
+    
+    return: generator of the arrays (index, is_max, y) of the peaks confirmed
+        by every chunk
+    """
+    detector = PeakDetector(lookahead, delta)
+    for chunk in chunks:
+        max_peaks, min_peaks = detector.push(chunk)
+        peaks = max_peaks + min_peaks
+        index = np.array([pos for pos, y in peaks], np.intp)
+        y = np.array([y for pos, y in peaks], chunk.dtype)
+        is_max = np.arange(len(peaks)) < len(max_peaks)
+        yield index, is_max, y
+
+
+def _stream_zero_crossing(chunks, window=11):
+    """
+    Chunked 'peakdetect_zero_crossing' for 'peakdetect_file', with the zero
+    crossings of 'ZeroCrossingTracker'. Only the samples from the last zero
+    crossing on are kept between chunks.
+    
+    The spacing of the crossings is checked like in 'zero_crossings' once
+    the signal has ended. An offset can't be removed by then, so a ValueError
+    is raised instead.
+    
+    return: generator of the arrays (index, is_max, y) of the peaks in the
+        bins closed by every chunk
+    """
+    tracker = ZeroCrossingTracker(window)
+    # samples of the signal from the global index 'start' on
+    buffer = None
+    start = 0
+    last = []
+    bins = 0
+    even_max = None
+    # running sums of the distances between the crossings
+    spacing = np.zeros(3)
+    for chunk in chunks:
+        buffer = chunk if buffer is None else np.concatenate((buffer, chunk))
+        crossings = np.append(last, np.maximum(tracker.push(chunk), 0))
+        crossings = crossings.astype(np.intp) - start
+        diff = np.diff(crossings)
+        spacing += len(diff), diff.sum(), np.square(diff, dtype=float).sum()
+        if len(crossings) > 1:
+            if even_max is None:
+                first = buffer[crossings[0]:crossings[1]]
+                even_max = abs(first.max()) > abs(first.min())
+            # the kind of the even bins alternates with the bins already done
+            channel, index, is_max = _peakdetect_zero_crossing(
+                buffer[np.newaxis], [crossings],
+                [even_max == (bins % 2 == 0)])
+            bins += len(crossings) - 1
+            yield index + start, is_max, buffer[index]
+        if len(crossings):
+            last = crossings[-1:] + start
+            keep = crossings[-1]
+        else:
+            # a crossing found later may lie up to about a window before
+            # the end of the samples pushed so far
+            keep = max(len(buffer) - 2 * window, 0)
+        buffer = buffer[keep:]
+        start += keep
+    count, total, squares = spacing
+    if count:
+        mean = total / count
+        std = np.sqrt(max(squares / count - mean ** 2, 0))
+        if std / mean > 0.1:
+            raise ValueError(
+                "False zero-crossings found, indicates problem {0!s} or "
+                "{1!s}".format("with smoothing window",
+                               "an offset, which must be removed first"))
+
+
+_FILE_METHODS = {
+    "peakdetect": _stream_peakdetect,
+    "peakdetect_zero_crossing": _stream_zero_crossing
+    }
+
+
+def peakdetect_file(path, dtype, sample_rate=None, method="peakdetect",
+                    chunk=1 << 20, offset=0, output="list", **kwargs):
+    """
+    Detects the peaks in a raw binary file of samples, e.g. as written by a
+    recorder, without loading the whole file into memory.
+    
+    The file is memory mapped and processed chunk by chunk by the streaming
+    version of the detector, while a background thread already reads the
+    next chunk. Only the chunk being processed, the one read ahead and the
+    state carried between chunks are held in memory, however large the file
+    is. The peaks are the same as those of the detector called on the whole
+    signal, see 'PeakDetector' and 'ZeroCrossingTracker'. The exception is
+    a signal with an offset, which 'peakdetect_zero_crossing' removes before
+    searching again; the file can't be searched twice, so a ValueError is
+    raised instead and the offset must be removed from the samples first.
+    
+    example:
+    
+    max_peaks, min_peaks = peakdetect_file("capture.bin", "<i2", 48000,
+                                           lookahead=20)
+    
+    keyword arguments:
+    path -- the path of the file
+    
+    dtype -- the numpy dtype of the samples, e.g. '<i2' for little-endian
+        int16 or '<f4' for little-endian float32
+    
+    sample_rate -- the sample rate of the signal, which gives the position of
+        the peaks in seconds. If omitted the sample index is used.
+        (default: None)
+    
+    method -- 'peakdetect' or 'peakdetect_zero_crossing'
+        (default: 'peakdetect')
+    
+    chunk -- the amount of samples processed at a time (default: 1 << 20)
+    
+    offset -- the amount of bytes to skip at the start of the file, e.g. a
+        header (default: 0)
+    
+    output -- 'list' for lists of [position, peak_value], or 'array' for
+        structured numpy arrays with the fields 'index', 'x' and 'y'
+        (default: 'list')
+    
+    **kwargs -- passed on to the detector: lookahead and delta for
+        'peakdetect', window for 'peakdetect_zero_crossing'
+    
+    
+    return: two lists [max_peaks, min_peaks] containing the positive and
+        negative peaks respectively, in the format of 'peakdetect'
+    """
+    try:
+        stream = _FILE_METHODS[method]
+    except KeyError:
+        raise ValueError("method must be one of {0}".format(
+            ", ".join(sorted(_FILE_METHODS))))
+    _datacheck_output(output)
+    if chunk < 1:
+        raise ValueError("chunk must be '1' or above in value")
+    dtype = np.dtype(dtype)
+    length = (os.path.getsize(path) - offset) // dtype.itemsize
+    
+    def read(start):
+        # the map is released again once the chunk is copied out of it,
+        # which keeps the pages of the file from adding up in memory
+        data = np.memmap(path, dtype, "r", offset + start * dtype.itemsize,
+                         (min(chunk, length - start),))
+        return np.array(data)
+    
+    def chunks(executor):
+        future = executor.submit(read, 0) if length > 0 else None
+        for start in range(0, length, chunk):
+            data = future.result()
+            if start + chunk < length:
+                future = executor.submit(read, start + chunk)
+            yield data
+    
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(1) as executor:
+        peaks = list(stream(chunks(executor), **kwargs))
+    
+    index, is_max, y = [np.concatenate([p[i] for p in peaks])
+                        if peaks else np.zeros(0, t) for i, t in
+                        enumerate((np.intp, bool, dtype))]
+    x = _UniformAxis(length, sample_rate=sample_rate)[index]
+    if output == "array":
+        return [_peak_array(index[select], x[select], y[select])
+                for select in (is_max, ~is_max)]
+    return [[[x[i], y[i]] for i in np.flatnonzero(select)]
+            for select in (is_max, ~is_max)]
+    
+    
+_BATCH_METHODS = {
+    "peakdetect": peakdetect,
+    "peakdetect_fft": peakdetect_fft,
+    "peakdetect_parabola": peakdetect_parabola,
+    "peakdetect_sine": peakdetect_sine,
+    "peakdetect_sine_locked": peakdetect_sine_locked,
+    "peakdetect_spline": peakdetect_spline,
+    "peakdetect_zero_crossing": peakdetect_zero_crossing,
+    "zero_crossings": zero_crossings,
+    "zero_crossings_sine_fit": zero_crossings_sine_fit
+    }
+
+
+class BatchFailure(object):
+    """
+    Takes the place of the result of a signal that failed in 'batch'.
+    
+    attributes:
+    index -- the position of the signal in the batch
+    
+    error -- the exception raised for the signal
+    
+    traceback -- the formatted traceback of the exception, from the worker
+        process where it was raised
+    """
+    
+    def __init__(self, index, error, traceback=""):
+        self.index = index
+        self.error = error
+        self.traceback = traceback
+    
+    def __repr__(self):
+        return "BatchFailure(index={0}, error={1!r})".format(self.index,
+                                                           self.error)
+
+
+def _load_signal(path):
+    """
+    Loads a signal stored by 'numpy.save', memory mapped, or as text by
+    'numpy.savetxt'
+    """
+    if str(path).endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    return np.loadtxt(path)
+
+
+def _batch_worker(method, source, kwargs):
+    """
+    Runs a detector on one signal of a batch, in a worker process.
+    
+    keyword arguments:
+    method -- the name of the detector in '_BATCH_METHODS'
+    
+    source -- ("path", path) for a stored signal, ("shared", name, shape,
+        dtype) for an array in shared memory or ("array", array)
+    
+    kwargs -- the keyword arguments of the detector
+    
+    
+    return: (True, result) or (False, error, traceback)
+    """
+    import pickle
+    import traceback
+    shm = None
+    try:
+        if source[0] == "shared":
+            from multiprocessing import shared_memory
+            shm = shared_memory.SharedMemory(name=source[1])
+            y_axis = np.ndarray(source[2], source[3], buffer=shm.buf)
+        elif source[0] == "path":
+            y_axis = _load_signal(source[1])
+        else:
+            y_axis = source[1]
+        result = _BATCH_METHODS[method](y_axis, **kwargs)
+        if shm is not None:
+            # nothing may refer to the shared memory once it is closed
+            result = pickle.loads(pickle.dumps(result, -1))
+        return (True, result)
+    except Exception as error:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(repr(error))
+        return (False, error, traceback.format_exc())
+    finally:
+        if shm is not None:
+            y_axis = None
+            shm.close()
+
+
+def batch(signals, method="peakdetect", processes=None, **kwargs):
+    """
+    Runs one of the detectors on many signals in parallel, using a pool of
+    worker processes.
+    
+    Arrays are handed to the workers through shared memory instead of being
+    pickled, and file paths are loaded by the workers themselves. Only a few
+    signals per worker are in flight at any time, so the shared memory used
+    stays bounded for long batches.
+    
+    example:
+    
+    results = batch(captures, "peakdetect_parabola", processes=8,
+                    x_axis=time)
+    failed = [r for r in results if isinstance(r, BatchFailure)]
+    
+    keyword arguments:
+    signals -- An iterable of signals, each either an array or the path of a
+        file saved by 'numpy.save' (.npy) or 'numpy.savetxt'
+    
+    method -- the name of the detector to run, e.g. 'peakdetect',
+        'peakdetect_parabola' or 'peakdetect_zero_crossing'
+        (default: 'peakdetect')
+    
+    processes -- the number of worker processes, None for one per CPU. With
+        1 the signals are processed in the calling process. This is the size
+        of the pool; 'workers' isn't, it's passed on to the detector as its
+        number of threads. (default: None)
+    
+    **kwargs -- passed on to the detector for every signal, e.g. x_axis, or
+        workers for the threads of a detector within every process
+    
+    
+    return: A list with the result of the detector for every signal, in the
+        order of the signals. A signal for which the detector raised has a
+        'BatchFailure' in its place instead of aborting the batch.
+    """
+    if method not in _BATCH_METHODS:
+        raise ValueError("method must be one of: {0}".format(
+            ", ".join(sorted(_BATCH_METHODS))))
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes < 1:
+        raise ValueError("processes must be at least 1")
+    
+    def source(signal):
+        if isinstance(signal, (str, bytes)) or hasattr(signal, "__fspath__"):
+            return ("path", signal)
+        return ("array", np.asarray(signal))
+    
+    results = []
+    def store(index, outcome):
+        if outcome[0]:
+            results[index] = outcome[1]
+        else:
+            results[index] = BatchFailure(index, *outcome[1:])
+    
+    if processes == 1:
+        for index, signal in enumerate(signals):
+            results.append(None)
+            store(index, _batch_worker(method, source(signal), kwargs))
+        return results
+    
+    from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED,
+                                    ProcessPoolExecutor, wait)
+    from multiprocessing import shared_memory
+    pending = {}
+    with ProcessPoolExecutor(processes) as executor:
+        def collect(return_when):
+            done, not_done = wait(pending, return_when=return_when)
+            for future in done:
+                index, shm = pending.pop(future)
+                try:
+                    store(index, future.result())
+                except Exception as error:
+                    # e.g. a worker process that died
+                    store(index, (False, error, ""))
+                finally:
+                    if shm is not None:
+                        shm.close()
+                        shm.unlink()
         
-        true_crossings.append(popt[0])
+        for index, signal in enumerate(signals):
+            results.append(None)
+            task = source(signal)
+            shm = None
+            if task[0] == "array" and task[1].nbytes:
+                array = task[1]
+                shm = shared_memory.SharedMemory(create=True,
+                                                 size=array.nbytes)
+                shared = np.ndarray(array.shape, array.dtype, buffer=shm.buf)
+                shared[...] = array
+                task = ("shared", shm.name, array.shape, array.dtype.str)
+            try:
+                future = executor.submit(_batch_worker, method, task, kwargs)
+            except Exception as error:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+                store(index, (False, error, ""))
+                continue
+            pending[future] = (index, shm)
+            if len(pending) >= 2 * processes:
+                collect(FIRST_COMPLETED)
+        if pending:
+            collect(ALL_COMPLETED)
     
-    return true_crossings
+    return results
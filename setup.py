@@ -20,5 +20,6 @@ setup(
     packages=['peakdetect'],
     url='https://github.com/avhn/peakdetect',
     author='avhn',
-    install_requires=reqs
+    install_requires=reqs,
+    extras_require={'numba': ['numba']}
 )
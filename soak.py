@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""
+Real-time replay soak test of the streaming detectors.
+
+The waveforms of the 'waveform' module are replayed chunk by chunk at a fixed
+sample rate into 'PeakDetector' and 'ZeroCrossingTracker', one per channel,
+with noise and a slow drift of the frequency added. Every chunk is handed
+over when its last sample would have been acquired, and the run reports:
+
+- the sustained samples/s the detectors processed, and the real-time factor,
+  i.e. how many times faster than the acquisition that is
+- percentiles of the latency of every chunk, from the acquisition of its
+  last sample to the detectors having processed it
+- percentiles of the delay from the acquisition of a peak, or zero crossing,
+  to it being reported
+- the resident memory (RSS) over time and its growth
+
+$ python soak.py --sample-rate 1000000 --channels 8 --duration 7200
+
+Detectors that fall behind real time, i.e. process an interval of the signal
+slower than it was acquired, are flagged and the exit status is then 1. With
+--no-pace the chunks are pushed as fast as possible, which measures the
+capacity without waiting for the signal.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+import benchmark
+import peakdetect
+import waveform
+
+
+class Histogram(object):
+    """
+    Percentiles of positive values, e.g. latencies, from counts in
+    logarithmic bins. The memory is fixed however many values are added, so
+    the histograms don't show up in the RSS growth of a long run.
+
+    keyword arguments:
+    low -- the lower edge of the first bin, smaller values are counted in it
+        (default: 1e-7)
+    high -- the upper edge of the last bin, larger values are counted in it
+        (default: 1e5)
+    bins_per_decade -- the resolution, the percentiles are within
+        10**(1 / bins_per_decade) of the exact ones (default: 50)
+    """
+
+    def __init__(self, low=1e-7, high=1e5, bins_per_decade=50):
+        self.low = low
+        self.bins_per_decade = bins_per_decade
+        bins = int(math.ceil(math.log10(high / low) * bins_per_decade))
+        self.counts = np.zeros(bins, np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, values):
+        """
+        Count the values of an array
+        """
+        values = np.asarray(values, np.float64).ravel()
+        if not len(values):
+            return
+        bins = np.log10(np.maximum(values, self.low) / self.low)
+        bins = np.minimum((bins * self.bins_per_decade).astype(np.intp),
+                          len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        self.count += len(values)
+        self.total += values.sum()
+        self.max = max(self.max, values.max())
+
+    def percentile(self, q):
+        """
+        return: the upper edge of the bin holding the q-th percentile, or
+            None when no values were added
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        index = np.searchsorted(np.cumsum(self.counts), max(rank, 1))
+        return min(self.low * 10 ** ((index + 1.0) / self.bins_per_decade),
+                   self.max)
+
+    def summary(self):
+        """
+        return: dict of the count, mean, max and the 50th, 90th, 99th and
+            99.9th percentiles
+        """
+        summary = {"count": self.count,
+                   "max": self.max if self.count else None,
+                   "mean": self.total / self.count if self.count else None}
+        for q in (50, 90, 99, 99.9):
+            summary["p{0:g}".format(q)] = self.percentile(q)
+        return summary
+
+
+def rss_bytes():
+    """
+    return: the resident memory of this process in bytes, or None when it
+        can't be read
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Replay(object):
+    """
+    Generates the signal replayed to the detectors, chunk by chunk
+
+    keyword arguments:
+    name -- the waveform, e.g. 'ACV_A1'
+    sample_rate -- the sample rate in Hz
+    channels -- the amount of channels, each shifted by an equal fraction of
+        a period
+    Hz -- the frequency of the waveform
+    noise -- the standard deviation of the gaussian noise added
+    drift -- the relative amplitude of a sinusoidal drift of the frequency,
+        e.g. 0.01 for +-1%
+    drift_period -- the period of the drift in seconds
+    seed -- the seed of the noise
+    """
+
+    def __init__(self, name, sample_rate, channels=1, Hz=benchmark.HZ,
+                 noise=0.0, drift=0.0, drift_period=60.0, seed=0):
+        if name not in waveform.__all__ or not name.startswith("ACV_"):
+            raise ValueError("unknown waveform '{0}'".format(name))
+        self.func = getattr(waveform, name)
+        self.sample_rate = sample_rate
+        self.Hz = Hz
+        self.noise = noise
+        self.drift = drift
+        self.drift_period = drift_period
+        self.shift = (np.arange(channels) / float(channels * Hz))[:, None]
+        self.rng = np.random.RandomState(seed)
+
+    def chunk(self, start, stop):
+        """
+        return: the samples start to stop of every channel as a 2-D array
+        """
+        t = np.arange(start, stop) / float(self.sample_rate)
+        if self.drift:
+            # the time is warped so that the frequency is
+            # Hz * (1 + drift * sin(2 pi t / drift_period))
+            w = 2 * math.pi / self.drift_period
+            t = t + self.drift / w * (1 - np.cos(w * t))
+        y = self.func(t + self.shift, self.Hz)
+        if self.noise:
+            y += self.rng.normal(0, self.noise, y.shape)
+        return y
+
+
+def _peakdetect(args):
+    """
+    return: a function pushing a chunk of every channel to a 'PeakDetector'
+        and returning the global sample indices of the peaks confirmed
+    """
+    detectors = [peakdetect.PeakDetector(args.lookahead, args.delta)
+                 for c in range(args.channels)]
+
+    def push(chunk):
+        found = []
+        for detector, y in zip(detectors, chunk):
+            max_peaks, min_peaks = detector.push(y)
+            found.extend(x for x, y in max_peaks)
+            found.extend(x for x, y in min_peaks)
+        return found
+    return push
+
+
+def _zero_crossings(args):
+    """
+    return: a function pushing a chunk of every channel to a
+        'ZeroCrossingTracker' and returning the global sample indices of the
+        zero crossings found
+    """
+    trackers = [peakdetect.ZeroCrossingTracker(args.window)
+                for c in range(args.channels)]
+
+    def push(chunk):
+        return np.concatenate([tracker.push(y)
+                               for tracker, y in zip(trackers, chunk)])
+    return push
+
+
+DETECTORS = {
+    "peakdetect": _peakdetect,
+    "zero_crossings": _zero_crossings
+    }
+
+
+def soak(detector, args, log=sys.stdout):
+    """
+    Replays the signal to one of the DETECTORS for args.duration seconds of
+    signal
+
+    return: dict of the 'summary' of the run and its 'timeline', one entry
+        per args.interval seconds of signal
+    """
+    rate = args.sample_rate
+    total = int(round(args.duration * rate))
+    replay = Replay(args.waveform, rate, args.channels, args.Hz, args.noise,
+                    args.drift, args.drift_period, args.seed)
+    push = DETECTORS[detector](args)
+    latency = Histogram()
+    delay = Histogram()
+    timeline = []
+    interval_samples = max(int(round(args.interval * rate)), 1)
+
+    events = 0
+    busy = 0.0
+    generate = 0.0
+    max_lag = 0.0
+    # the statistics of the current interval of the timeline
+    interval_busy = 0.0
+    interval_latency = []
+    interval_start = 0
+    first_rss = rss_bytes()
+    start_time = time.perf_counter()
+    for start in range(0, total, args.chunk):
+        stop = min(start + args.chunk, total)
+        before = time.perf_counter()
+        chunk = replay.chunk(start, stop)
+        generate += time.perf_counter() - before
+
+        # the chunk is complete once its last sample has been acquired
+        due = start_time + stop / float(rate)
+        if args.pace:
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        begin = time.perf_counter()
+        found = push(chunk)
+        finish = time.perf_counter()
+
+        busy += finish - begin
+        interval_busy += finish - begin
+        # paced, the latency includes any backlog of earlier chunks
+        chunk_latency = finish - due if args.pace else finish - begin
+        max_lag = max(max_lag, chunk_latency)
+        latency.add([chunk_latency])
+        interval_latency.append(chunk_latency)
+        if len(found):
+            # from the acquisition of the sample to the report
+            found = np.asarray(found, np.float64)
+            delay.add((stop - found - 1) / rate + chunk_latency)
+            events += len(found)
+
+        if stop - interval_start >= interval_samples or stop == total:
+            entry = {
+                "signal_time": stop / float(rate),
+                "wall_time": finish - start_time,
+                "samples_per_s": (stop - interval_start) * args.channels /
+                                 interval_busy if interval_busy else None,
+                "realtime_factor": (stop - interval_start) / float(rate) /
+                                   interval_busy if interval_busy else None,
+                "latency_p99": float(np.percentile(interval_latency, 99)),
+                "latency_max": max(interval_latency),
+                "rss": rss_bytes()
+                }
+            entry["behind"] = (entry["realtime_factor"] is not None and
+                               entry["realtime_factor"] < 1)
+            timeline.append(entry)
+            log.write(format_interval(detector, entry) + "\n")
+            log.flush()
+            interval_start = stop
+            interval_busy = 0.0
+            interval_latency = []
+
+    summary = {
+        "samples": total * args.channels,
+        "events": events,
+        "wall_time": time.perf_counter() - start_time,
+        "busy_time": busy,
+        "generate_time": generate,
+        "samples_per_s": total * args.channels / busy if busy else None,
+        "realtime_factor": total / float(rate) / busy if busy else None,
+        "max_lag": max_lag,
+        "latency": latency.summary(),
+        "delay": delay.summary(),
+        "behind": any(entry["behind"] for entry in timeline)
+        }
+    summary.update(rss_growth(first_rss, timeline))
+    return {"summary": summary, "timeline": timeline}
+
+
+def rss_growth(first_rss, timeline):
+    """
+    return: dict of the RSS at the start and end of a run, its growth from
+        the end of the first interval of the timeline, which covers the warm
+        up, and the slope of a line fitted to the RSS from then on in bytes
+        per hour
+    """
+    rss = [(entry["wall_time"], entry["rss"]) for entry in timeline
+           if entry["rss"] is not None]
+    growth = {"rss_start": first_rss, "rss_end": rss[-1][1] if rss else None,
+              "rss_growth": None, "rss_growth_per_hour": None}
+    if len(rss) > 1:
+        growth["rss_growth"] = rss[-1][1] - rss[0][1]
+    if len(rss) > 2:
+        t, r = np.array(rss, np.float64).T
+        if t[-1] > t[0]:
+            growth["rss_growth_per_hour"] = float(np.polyfit(t, r, 1)[0] *
+                                                  3600)
+    return growth
+
+
+def _ms(seconds):
+    return "-" if seconds is None else "{0:.3f} ms".format(seconds * 1e3)
+
+
+def format_interval(detector, entry):
+    """
+    return: a line of the progress report for an interval of the timeline
+    """
+    line = "{0:<15} {1:10.1f} s  {2:11.4g} samples/s  x{3:<8.3g}".format(
+        detector, entry["signal_time"], entry["samples_per_s"] or 0,
+        entry["realtime_factor"] or float("inf"))
+    line += "  latency p99 {0:>12}".format(_ms(entry["latency_p99"]))
+    if entry["rss"] is not None:
+        line += "  rss {0:8.1f} MB".format(entry["rss"] / 1e6)
+    if entry["behind"]:
+        line += "  BEHIND"
+    return line
+
+
+def format_summary(detector, summary):
+    """
+    return: the lines of the report of a run
+    """
+    lines = ["{0}: {1} samples, {2} events, {3:.4g} samples/s, "
+             "x{4:.3g} real time{5}".format(
+                 detector, summary["samples"], summary["events"],
+                 summary["samples_per_s"] or 0,
+                 summary["realtime_factor"] or float("inf"),
+                 ", FELL BEHIND" if summary["behind"] else "")]
+    for name in ("latency", "delay"):
+        stats = summary[name]
+        lines.append("  {0:<8} p50 {1}  p90 {2}  p99 {3}  p99.9 {4}  max "
+                     "{5}".format(name, *[_ms(stats[key]) for key in
+                                          ("p50", "p90", "p99", "p99.9",
+                                           "max")]))
+    if summary["rss_growth"] is not None:
+        lines.append("  rss {0:.1f} MB, growth {1:+.1f} MB".format(
+            summary["rss_end"] / 1e6, summary["rss_growth"] / 1e6) +
+            ("" if summary["rss_growth_per_hour"] is None else
+             " ({0:+.1f} MB/h)".format(summary["rss_growth_per_hour"] / 1e6)))
+    return lines
+
+
+def main(argv=None, log=sys.stdout):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+        "\n")[0])
+    parser.add_argument("--detectors", nargs="+", choices=sorted(DETECTORS),
+                        default=sorted(DETECTORS),
+                        help="the detectors to run (default: all)")
+    parser.add_argument("--waveform", default="ACV_A1",
+                        choices=[name for name in waveform.__all__
+                                 if name.startswith("ACV_")],
+                        help="the waveform replayed (default: ACV_A1)")
+    parser.add_argument("--sample-rate", type=float, default=1e6,
+                        help="samples/s of every channel (default: 1e6)")
+    parser.add_argument("--duration", type=float, default=60,
+                        help="seconds of signal replayed to every detector "
+                        "(default: 60)")
+    parser.add_argument("--chunk", type=int, default=1 << 16,
+                        help="samples per chunk (default: 65536)")
+    parser.add_argument("--channels", type=int, default=1,
+                        help="the amount of channels (default: 1)")
+    parser.add_argument("--Hz", type=float, default=benchmark.HZ,
+                        help="the frequency of the waveform (default: "
+                        "{0})".format(benchmark.HZ))
+    parser.add_argument("--noise", type=float, default=10.0,
+                        help="standard deviation of the noise, the waveforms "
+                        "are about 1414 in amplitude (default: 10)")
+    parser.add_argument("--drift", type=float, default=0.01,
+                        help="relative drift of the frequency (default: "
+                        "0.01)")
+    parser.add_argument("--drift-period", type=float, default=60.0,
+                        help="period of the drift in seconds (default: 60)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the noise (default: 0)")
+    parser.add_argument("--lookahead", type=int,
+                        help="lookahead of 'peakdetect' (default: a quarter "
+                        "period)")
+    parser.add_argument("--delta", type=float, default=0,
+                        help="delta of 'peakdetect' (default: 0)")
+    parser.add_argument("--window", type=int, default=11,
+                        help="smoothing window of 'zero_crossings' "
+                        "(default: 11)")
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="seconds of signal per line of the timeline "
+                        "(default: 10)")
+    parser.add_argument("--no-pace", dest="pace", action="store_false",
+                        help="push the chunks as fast as possible instead "
+                        "of at the sample rate")
+    parser.add_argument("--output", default="soak.json",
+                        help="the JSON file written (default: soak.json)")
+    args = parser.parse_args(argv)
+    if args.chunk < 1 or args.channels < 1 or args.sample_rate <= 0:
+        parser.error("--chunk, --channels and --sample-rate must be positive")
+    if args.lookahead is None:
+        args.lookahead = max(int(args.sample_rate / args.Hz / 4), 1)
+
+    runs = {}
+    for detector in args.detectors:
+        runs[detector] = soak(detector, args, log)
+    for detector, run in runs.items():
+        log.write("\n".join(format_summary(detector, run["summary"])) + "\n")
+    with open(args.output, "w") as f:
+        json.dump({"environment": benchmark.environment(),
+                   "config": vars(args), "runs": runs}, f, indent=1)
+
+    behind = [detector for detector, run in runs.items()
+              if run["summary"]["behind"]]
+    if behind:
+        log.write("\nfell behind real time: {0}\n".format(", ".join(behind)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
+import os
+import sys
+import time
 import unittest
 
 import peakdetect
 import waveform
 
+# the module is shadowed by the function of the same name in the package
+_peakdetect = sys.modules["peakdetect.peakdetect"]
+
 # generate time axis for 5 cycles @ 50 Hz
 linspace_standard = np.linspace(0, 0.10, 1000)
 linspace_peakdetect = np.linspace(0, 0.10, 10000)
@@ -21,7 +27,7 @@ def prng():
 
 
 def _write_log(file, header, message):
-    with open(file, "ab") as f:
+    with open(file, "a") as f:
         f.write(header)
         f.write("\n")
         f.writelines(message)
@@ -136,6 +142,19 @@ def _is_close(max_p, min_p,
     return t_max_close, y_max_close, t_min_close, y_min_close
 
 
+def _assert_same(received, expected):
+    """
+    Asserts that two results of the detectors hold the same peaks
+    
+    keyword arguments:
+    received -- [max_peaks, min_peaks] as structured arrays
+    expected -- [max_peaks, min_peaks] as structured arrays
+    """
+    assert len(received) == len(expected)
+    for r, e in zip(received, expected):
+        np.testing.assert_array_equal(r, e)
+
+
 class Test_analytic_wfm(unittest.TestCase):
     def test_ACV1(self):
         # compare with previous lambda implementation
@@ -522,6 +541,555 @@ class Test_peakdetect(TestPeakdetectTemplate):
         self.func = peakdetect.peakdetect
  
  
+class Test_peakdetect_engines(unittest.TestCase):
+    def _compare_engines(self, y, x=None, lookahead=200, delta=0):
+        expected = peakdetect.peakdetect(y, x, lookahead, delta,
+                                         engine="python")
+        received = peakdetect.peakdetect(y, x, lookahead, delta,
+                                         engine="numpy")
+        self.assertEqual(received, expected)
+
+    def test_noisy_sine(self):
+        y = waveform.ACV_A1(linspace_peakdetect)
+        y += prng().normal(0, 50, len(y))
+        self._compare_engines(y, linspace_peakdetect, 100)
+        self._compare_engines(y, linspace_peakdetect, 100, 200)
+
+    def test_random_walk(self):
+        rng = prng()
+        for lookahead in [1, 2, 7, 50]:
+            y = np.cumsum(rng.normal(0, 1, 5000))
+            self._compare_engines(y, None, lookahead)
+            self._compare_engines(y, None, lookahead, 2)
+
+    def test_plateaus(self):
+        y = prng().randint(0, 4, 2000)
+        self._compare_engines(y, None, 3)
+        self._compare_engines(y, None, 3, 1)
+
+    def test_nan(self):
+        # NaN samples are never a peak, and hold off confirming one while
+        # they are within the lookahead
+        y = np.sin(np.linspace(0, 40 * np.pi, 20000))
+        y[3000] = np.nan
+        self._compare_engines(y, None, 100)
+        self.assertEqual([len(p) for p in peakdetect.peakdetect(y, None, 100)],
+                         [20, 20])
+        rng = prng()
+        for lookahead in [1, 7, 50]:
+            y = np.cumsum(rng.normal(0, 1, 5000))
+            y[rng.rand(len(y)) < 0.02] = np.nan
+            y[:20] = np.nan
+            self._compare_engines(y, None, lookahead)
+            self._compare_engines(y, None, lookahead, 2)
+
+    def test_short_signal(self):
+        self._compare_engines(np.arange(5), None, 10)
+        self.assertEqual(peakdetect.peakdetect(np.arange(5), None, 10),
+                         [[], []])
+
+    def test_sliding_extreme(self):
+        y = prng().normal(0, 1, 1000)
+        for window in [1, 2, 5, 64, 999, 1000]:
+            expected = [y[i:i + window].max()
+                        for i in range(len(y) - window + 1)]
+            received = _peakdetect._sliding_extreme(
+                y, window, np.maximum, chunk=128)
+            self.assertTrue(np.array_equal(received, expected))
+
+    def test_invalid_engine(self):
+        with self.assertRaises(ValueError):
+            peakdetect.peakdetect(np.arange(10), engine="fortran")
+
+
+class Test_PeakDetector(unittest.TestCase):
+    def _compare_chunked(self, y, x, chunks, lookahead=200, delta=0):
+        expected = peakdetect.peakdetect(y, x, lookahead, delta)
+        detector = peakdetect.PeakDetector(lookahead, delta)
+        received = [[], []]
+        bounds = np.r_[0, chunks, len(y)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            x_chunk = None if x is None else x[start:stop]
+            max_peaks, min_peaks = detector.push(y[start:stop], x_chunk)
+            received[0].extend(max_peaks)
+            received[1].extend(min_peaks)
+        self.assertEqual(detector.flush(), [[], []])
+        self.assertEqual(received, expected)
+
+    def test_chunked_sine(self):
+        y = waveform.ACV_A3(linspace_peakdetect)
+        self._compare_chunked(y, linspace_peakdetect, [1000, 2000, 7777])
+        self._compare_chunked(y, None, np.arange(150, 10000, 150))
+
+    def test_chunked_noise(self):
+        rng = prng()
+        y = rng.normal(0, 1, 3000)
+        chunks = np.sort(rng.randint(0, 3000, 40))
+        self._compare_chunked(y, None, chunks, 5)
+        self._compare_chunked(y, None, chunks, 5, 0.5)
+        # chunks shorter than the lookahead
+        self._compare_chunked(y, None, np.arange(3, 3000, 3), 20)
+
+    def test_mixed_x_chunks(self):
+        detector = peakdetect.PeakDetector(10)
+        detector.push(np.zeros(5))
+        with self.assertRaises(ValueError):
+            detector.push(np.zeros(5), np.arange(5))
+
+
+class Test_ZeroCrossingTracker(unittest.TestCase):
+    def _compare_chunked(self, y, chunks, window_len=11, window_f="hanning"):
+        # the unchecked crossings of 'zero_crossings'
+        smooth = _peakdetect._smooth(y, window_len, window_f)[:len(y)]
+        expected = (np.where(np.diff(np.sign(smooth)))[0] -
+                    (window_len // 2 - 1))
+        tracker = peakdetect.ZeroCrossingTracker(window_len, window_f)
+        received = np.concatenate([tracker.push(chunk)
+                                   for chunk in np.split(y, chunks)])
+        self.assertListEqual(list(received), list(expected))
+
+    def test_chunked_sine(self):
+        y = waveform.ACV_A1(linspace_peakdetect)
+        self._compare_chunked(y, [1000, 2000, 7777], 50)
+        self.assertListEqual(
+            list(peakdetect.ZeroCrossingTracker(50).push(y)),
+            list(peakdetect.zero_crossings(y, 50)))
+
+    def test_chunked_noise(self):
+        rng = prng()
+        y = (np.sin(np.linspace(0, 100, 5000)) +
+             rng.normal(0, 0.1, 5000))
+        chunks = np.sort(rng.randint(0, 5000, 60))
+        for window_f in ["flat", "hanning", "blackman"]:
+            self._compare_chunked(y, chunks, 11, window_f)
+        # chunks shorter than the window
+        self._compare_chunked(y, np.arange(3, 5000, 3), 31)
+
+
+class Test_batch(unittest.TestCase):
+    def setUp(self):
+        rng = prng()
+        self.signals = [np.sin(np.linspace(0, 20 + i, 2000)) +
+                        rng.normal(0, 0.05, 2000) for i in range(6)]
+
+    def test_pool(self):
+        expected = [peakdetect.peakdetect(y, lookahead=20)
+                    for y in self.signals]
+        serial = peakdetect.batch(self.signals, processes=1, lookahead=20)
+        pooled = peakdetect.batch(self.signals, processes=2, lookahead=20)
+        self.assertEqual(serial, expected)
+        self.assertEqual(pooled, expected)
+        # workers is left to the detector
+        threaded = peakdetect.batch(self.signals, processes=2, lookahead=20,
+                                    workers=2)
+        self.assertEqual(threaded, expected)
+
+    def test_paths(self):
+        import tempfile
+        signals = [np.sin(np.linspace(0, 20 + i, 2000)) for i in range(3)]
+        with tempfile.TemporaryDirectory() as folder:
+            npy = os.path.join(folder, "y.npy")
+            txt = os.path.join(folder, "y.txt")
+            np.save(npy, signals[0])
+            np.savetxt(txt, signals[1], "%.18e")
+            results = peakdetect.batch([npy, txt, signals[2]],
+                                       "zero_crossings", processes=2)
+        for received, y in zip(results, signals):
+            self.assertListEqual(list(received),
+                                 list(peakdetect.zero_crossings(y)))
+
+    def test_failure(self):
+        signals = [self.signals[0], np.zeros(5), self.signals[1]]
+        for processes in [1, 2]:
+            results = peakdetect.batch(signals, "zero_crossings",
+                                       processes=processes)
+            self.assertIsInstance(results[1], peakdetect.BatchFailure)
+            self.assertIsInstance(results[1].error, ValueError)
+            self.assertEqual(results[1].index, 1)
+            self.assertIn("ValueError", results[1].traceback)
+            self.assertListEqual(list(results[2]),
+                                 list(peakdetect.zero_crossings(signals[2])))
+        self.assertRaises(ValueError, peakdetect.batch, signals, "fit")
+
+
+class Test_workers(unittest.TestCase):
+    def setUp(self):
+        # short segments and blocks, so that many of them are stitched
+        self.limits = _peakdetect._SEGMENT_MIN, _peakdetect._SMOOTH_BLOCK
+        _peakdetect._SEGMENT_MIN = 500
+        _peakdetect._SMOOTH_BLOCK = 1000
+
+    def tearDown(self):
+        _peakdetect._SEGMENT_MIN, _peakdetect._SMOOTH_BLOCK = self.limits
+
+    def test_peakdetect(self):
+        rng = prng()
+        y = np.cumsum(rng.normal(0, 1, 40000))
+        for lookahead, delta in [(1, 0), (20, 0), (200, 5)]:
+            expected = peakdetect.peakdetect(y, lookahead=lookahead,
+                                             delta=delta, output="array")
+            for workers in [2, 3, 8]:
+                _assert_same(
+                    peakdetect.peakdetect(y, lookahead=lookahead, delta=delta,
+                                          output="array", workers=workers),
+                    expected)
+        self.assertRaises(ValueError, peakdetect.peakdetect, y,
+                          engine="python", workers=2)
+
+    def test_zero_crossing(self):
+        rng = prng()
+        y = (np.sin(np.linspace(0, 400, 30000)) + 0.2 +
+             rng.normal(0, 0.01, 30000))
+        expected = peakdetect.peakdetect_zero_crossing(y, window=51,
+                                                       output="array")
+        for workers in [2, 3, 8]:
+            _assert_same(
+                peakdetect.peakdetect_zero_crossing(y, window=51,
+                                                    output="array",
+                                                    workers=workers),
+                expected)
+            self.assertListEqual(
+                list(peakdetect.zero_crossings(y, 51, "flat",
+                                               workers=workers)),
+                list(peakdetect.zero_crossings(y, 51, "flat")))
+
+
+class Test_backend(unittest.TestCase):
+    def setUp(self):
+        rng = prng()
+        self.noise = np.cumsum(rng.normal(0, 1, 20000))
+        self.sine = (np.sin(np.linspace(0, 200, 20000)) +
+                     rng.normal(0, 0.01, 20000))
+
+    def _compare(self, backend):
+        expected = peakdetect.peakdetect(self.noise, lookahead=20,
+                                         engine="python", output="array")
+        _assert_same(
+            peakdetect.peakdetect(self.noise, lookahead=20, output="array",
+                                  backend=backend),
+            expected)
+        channels = np.vstack([self.noise, -self.noise])
+        _assert_same(
+            peakdetect.peakdetect(channels, lookahead=20, output="array",
+                                  backend=backend),
+            peakdetect.peakdetect(channels, lookahead=20, output="array",
+                                  backend="numpy"))
+        for y in [self.sine, np.vstack([self.sine, -self.sine])]:
+            _assert_same(
+                peakdetect.peakdetect_zero_crossing(y, window=51,
+                                                    output="array",
+                                                    backend=backend),
+                peakdetect.peakdetect_zero_crossing(y, window=51,
+                                                    output="array",
+                                                    backend="numpy"))
+
+    def test_numpy(self):
+        self._compare("numpy")
+
+    @unittest.skipUnless(_peakdetect._numba_installed(),
+                         "Numba is not installed")
+    def test_numba(self):
+        self._compare("numba")
+        _assert_same(
+            peakdetect.peakdetect_zero_crossing(self.sine, window=51,
+                                                output="array", workers=3,
+                                                backend="numba"),
+            peakdetect.peakdetect_zero_crossing(self.sine, window=51,
+                                                output="array"))
+
+    def test_selection(self):
+        numpy_kernels = _peakdetect._BACKENDS["numpy"]
+        previous = os.environ.get("PEAKDETECT_BACKEND")
+        try:
+            os.environ["PEAKDETECT_BACKEND"] = "numpy"
+            self.assertIs(_peakdetect._datacheck_backend(None), numpy_kernels)
+            os.environ["PEAKDETECT_BACKEND"] = "fortran"
+            self.assertRaises(ValueError, peakdetect.peakdetect, self.noise)
+        finally:
+            if previous is None:
+                del os.environ["PEAKDETECT_BACKEND"]
+            else:
+                os.environ["PEAKDETECT_BACKEND"] = previous
+        if _peakdetect._numba_installed():
+            self.assertIs(_peakdetect._datacheck_backend("auto"),
+                          _peakdetect._BACKENDS["numba"])
+        else:
+            self.assertIs(_peakdetect._datacheck_backend("auto"),
+                          numpy_kernels)
+            self.assertRaises(ImportError, _peakdetect._datacheck_backend,
+                              "numba")
+
+
+class Test_peakdetect_file(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        rng = prng()
+        self.y = (np.sin(np.linspace(0, 300, 50000)) * 3000 +
+                  rng.normal(0, 30, 50000)).astype("<i2")
+        handle, self.path = tempfile.mkstemp()
+        with open(handle, "wb") as f:
+            f.write(b"header")
+            self.y.tofile(f)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_peakdetect(self):
+        expected = peakdetect.peakdetect(self.y, lookahead=50, output="array")
+        for chunk in [1000, 4099, 1 << 20]:
+            _assert_same(peakdetect.peakdetect_file(
+                self.path, "<i2", chunk=chunk, offset=6, lookahead=50,
+                output="array"), expected)
+        received = peakdetect.peakdetect_file(self.path, "<i2", 1000.0,
+                                              offset=6, lookahead=50)
+        self.assertEqual(received, peakdetect.peakdetect(
+            self.y, np.arange(len(self.y)) / 1000.0, lookahead=50))
+
+    def test_zero_crossing(self):
+        expected = peakdetect.peakdetect_zero_crossing(self.y, window=31,
+                                                       output="array")
+        for chunk in [7, 1000, 1 << 20]:
+            _assert_same(peakdetect.peakdetect_file(
+                self.path, "<i2", method="peakdetect_zero_crossing",
+                chunk=chunk, offset=6, window=31, output="array"), expected)
+
+    def test_zero_crossing_offset(self):
+        import tempfile
+        t = np.arange(50000)
+        y = ((np.sin(2 * np.pi * t / 500) + 0.7 + prng().normal(0, 0.05,
+                                                                 len(t)))
+             * 1000).astype("<f4")
+        handle, path = tempfile.mkstemp()
+        try:
+            with open(handle, "wb") as f:
+                y.tofile(f)
+            # the whole signal has its offset removed, the file can't
+            self.assertRaises(ValueError, peakdetect.peakdetect_file, path,
+                              "<f4", method="peakdetect_zero_crossing",
+                              chunk=4096, window=31)
+            centred = y - np.float32(700)
+            with open(path, "wb") as f:
+                centred.tofile(f)
+            _assert_same(peakdetect.peakdetect_file(
+                path, "<f4", method="peakdetect_zero_crossing", chunk=4096,
+                window=31, output="array"),
+                peakdetect.peakdetect_zero_crossing(centred, window=31,
+                                                    output="array"))
+        finally:
+            os.remove(path)
+
+
+class Test_benchmark(unittest.TestCase):
+    def test_run(self):
+        import io
+        import json
+        import tempfile
+        import benchmark
+        log = io.StringIO()
+        with tempfile.TemporaryDirectory() as folder:
+            output = os.path.join(folder, "benchmark.json")
+            args = ["--sizes", "3", "--detectors", "peakdetect",
+                    "peakdetect_parabola", "--waveforms", "ACV_A1",
+                    "--min-time", "0", "--output", output]
+            self.assertEqual(benchmark.main(args, log), 0)
+            with open(output) as f:
+                results = json.load(f)["results"]
+            self.assertEqual([r["detector"] for r in results],
+                             ["peakdetect", "peakdetect_parabola"])
+            for r in results:
+                self.assertEqual(r["size"], 1000)
+                self.assertGreater(r["peaks"], 0)
+                self.assertAlmostEqual(r["samples_per_s"],
+                                       r["size"] / r["wall_time"])
+            # a rerun is compared with the first one, allowing for noise
+            self.assertEqual(benchmark.main(args + ["--baseline", output,
+                                                    "--threshold", "100"],
+                                            log), 0)
+            self.assertEqual(benchmark.main(args + ["--baseline", output,
+                                                    "--threshold", "-1"],
+                                            log), 1)
+        self.assertIn("regression(s) slower", log.getvalue())
+
+
+class Test_iter_waveform(unittest.TestCase):
+    def test_iter_waveform(self):
+        import tempfile
+        t = np.arange(100001) / 10000
+        for name in ["ACV_A5", "ACV_A7", "ACV_A8"]:
+            expected = getattr(waveform, name)(t)
+            with tempfile.TemporaryDirectory() as folder:
+                # generated and saved, then read back
+                for i in range(2):
+                    blocks = list(waveform.iter_waveform(name, len(t), 10000,
+                                                         chunk=30000,
+                                                         cache=folder))
+                    self.assertEqual([len(b) for b in blocks],
+                                     [30000, 30000, 30000, 10001])
+                    np.testing.assert_array_equal(np.concatenate(blocks),
+                                                  expected)
+                self.assertEqual(len(os.listdir(folder)), 1)
+        np.testing.assert_array_equal(waveform.H([-1, 0, 2.5]), [0, 0, 1])
+        self.assertRaises(ValueError, waveform.iter_waveform, "H", 10, 10)
+
+
+class Test_soak(unittest.TestCase):
+    def test_soak(self):
+        import io
+        import json
+        import tempfile
+        import soak
+        log = io.StringIO()
+        with tempfile.TemporaryDirectory() as folder:
+            output = os.path.join(folder, "soak.json")
+            args = ["--sample-rate", "10000", "--chunk", "500",
+                    "--channels", "3", "--interval", "0.1", "--output",
+                    output]
+            # paced, the replay takes as long as the signal
+            start = time.perf_counter()
+            self.assertEqual(soak.main(args + ["--duration", "0.2"], log), 0)
+            self.assertGreaterEqual(time.perf_counter() - start, 0.4)
+            with open(output) as f:
+                runs = json.load(f)["runs"]
+            self.assertEqual(sorted(runs), ["peakdetect", "zero_crossings"])
+            summary = runs["peakdetect"]["summary"]
+            self.assertEqual(summary["samples"], 6000)
+            # two peaks a period, the first one of every channel is dropped
+            self.assertAlmostEqual(summary["events"], 3 * 2 * 10, delta=6)
+            # a peak is confirmed 'lookahead' samples after it at the earliest
+            self.assertGreater(summary["delay"]["p50"], 50 / 10000.)
+            self.assertEqual(len(runs["peakdetect"]["timeline"]), 2)
+            self.assertFalse(summary["behind"])
+            # far beyond what can be processed in real time
+            self.assertEqual(soak.main(["--sample-rate", "1e9", "--duration",
+                                        "1e-5", "--chunk", "1000",
+                                        "--no-pace", "--output", output],
+                                       log), 1)
+        self.assertIn("fell behind real time", log.getvalue())
+
+        histogram = soak.Histogram()
+        histogram.add(np.linspace(0.001, 1, 1000))
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.025)
+        self.assertEqual(histogram.percentile(100), 1)
+
+
+class Test_imports(unittest.TestCase):
+    def test_imports(self):
+        import io
+        import json
+        import subprocess
+        import tempfile
+        import benchmark
+        # scipy is only imported by the detectors that use it
+        code = ("import sys, peakdetect; print(sorted(m for m in sys.modules "
+                "if m.startswith(('scipy.fft', 'scipy.signal'))))")
+        output = subprocess.run([sys.executable, "-c", code],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, check=True,
+                                universal_newlines=True).stdout
+        self.assertEqual(output.strip(), "[]")
+        with tempfile.TemporaryDirectory() as folder:
+            output = os.path.join(folder, "imports.json")
+            self.assertEqual(benchmark.main(["--imports", "--output", output,
+                                             "--import-overhead", "100"],
+                                            io.StringIO()), 0)
+            with open(output) as f:
+                times = json.load(f)["imports"]
+            self.assertEqual(sorted(times), ["numpy", "peakdetect"])
+
+
+class Test_multi_channel(unittest.TestCase):
+    def setUp(self):
+        rng = prng()
+        self.y = np.array([
+            waveform.ACV_A1(linspace_peakdetect),
+            waveform.ACV_A3(linspace_peakdetect),
+            waveform.ACV_A5(linspace_peakdetect) + rng.normal(0, 5, 10000)
+            ])
+
+    def _compare_channels(self, func, *args, **kwargs):
+        signal = kwargs.pop("signal", self.y)
+        received = func(signal, linspace_peakdetect, *args, **kwargs)
+        transposed = func(signal.T, linspace_peakdetect, *args, axis=0,
+                          **kwargs)
+        for channel, y in enumerate(signal):
+            expected = func(y, linspace_peakdetect, *args, **kwargs)
+            for peaks, ragged, ragged_t in zip(expected, received, transposed):
+                self.assertEqual(ragged[channel], list(peaks))
+                self.assertEqual(ragged_t[channel], list(peaks))
+
+    def test_peakdetect(self):
+        self._compare_channels(peakdetect.peakdetect, 100)
+        self._compare_channels(peakdetect.peakdetect, 100, engine="python")
+
+    def test_peakdetect_zero_crossing(self):
+        self._compare_channels(peakdetect.peakdetect_zero_crossing)
+
+    def test_peakdetect_spline(self):
+        # the spline interpolation can't handle the noisy channel
+        self._compare_channels(peakdetect.peakdetect_spline,
+                               signal=self.y[:2])
+
+    def test_zero_crossings(self):
+        received = peakdetect.zero_crossings(self.y)
+        for channel, y in enumerate(self.y):
+            self.assertTrue(np.array_equal(received[channel],
+                                           peakdetect.zero_crossings(y)))
+
+    def test_ragged_peaks(self):
+        max_peaks, min_peaks = peakdetect.peakdetect(self.y,
+                                                     linspace_peakdetect, 100)
+        self.assertEqual(len(max_peaks), 3)
+        self.assertEqual(list(max_peaks.counts()), [5, 5, 5])
+        self.assertEqual(max_peaks[-1], max_peaks[2])
+        self.assertEqual(list(max_peaks), [max_peaks[i] for i in range(3)])
+
+
+class Test_array_output(unittest.TestCase):
+    def setUp(self):
+        self.y = waveform.ACV_A3(linspace_peakdetect)
+
+    def _compare_output(self, func, fields, *args):
+        lists = func(self.y, linspace_peakdetect, *args)
+        arrays = func(self.y, linspace_peakdetect, *args, output="array")
+        for peaks, array in zip(lists, arrays):
+            self.assertEqual(array.dtype.names, fields)
+            self.assertTrue(np.array_equal(array["x"], [p[0] for p in peaks]))
+            self.assertTrue(np.array_equal(array["y"], [p[1] for p in peaks]))
+            # the index points at the sample closest to the peak
+            self.assertTrue(np.allclose(linspace_peakdetect[array["index"]],
+                                        array["x"], rtol=0, atol=2e-5))
+
+    def test_peakdetect(self):
+        self._compare_output(peakdetect.peakdetect, ("index", "x", "y"), 100)
+
+    def test_peakdetect_zero_crossing(self):
+        self._compare_output(peakdetect.peakdetect_zero_crossing,
+                             ("index", "x", "y"))
+
+    def test_peakdetect_parabola(self):
+        self._compare_output(peakdetect.peakdetect_parabola,
+                             ("index", "x", "y", "a"))
+
+    def test_peakdetect_spline(self):
+        self._compare_output(peakdetect.peakdetect_spline,
+                             ("index", "x", "y"))
+
+    def test_multi_channel(self):
+        y = np.array([self.y, -self.y])
+        max_peaks, min_peaks = peakdetect.peakdetect(
+            y, linspace_peakdetect, 100, output="array")
+        self.assertEqual(max_peaks.dtype.names, ("channel", "index", "x", "y"))
+        ragged = peakdetect.peakdetect(y, linspace_peakdetect, 100)[0]
+        for channel in range(2):
+            peaks = max_peaks[max_peaks["channel"] == channel]
+            self.assertTrue(np.array_equal(peaks["y"],
+                                           [p[1] for p in ragged[channel]]))
+
+    def test_invalid_output(self):
+        with self.assertRaises(ValueError):
+            peakdetect.peakdetect(self.y, output="dict")
+
+
 class Test_peakdetect_fft(TestPeakdetectTemplate):
     name = "peakdetect_fft"
 
@@ -530,6 +1098,15 @@ class Test_peakdetect_fft(TestPeakdetectTemplate):
         self.func = peakdetect.peakdetect_fft
             
         
+class Test_peakdetect_fft_local(TestPeakdetectTemplate):
+    name = "peakdetect_fft_local"
+    kwargs = {"mode": "local"}
+
+    def __init__(self, *args, **kwargs):
+        super(Test_peakdetect_fft_local, self).__init__(*args, **kwargs)
+        self.func = peakdetect.peakdetect_fft
+            
+        
 class Test_peakdetect_parabola(TestPeakdetectTemplate):
     name = "peakdetect_parabola"
 
@@ -562,6 +1139,15 @@ class Test_peakdetect_spline(TestPeakdetectTemplate):
         self.func = peakdetect.peakdetect_spline
             
         
+class Test_peakdetect_spline_analytic(TestPeakdetectTemplate):
+    name = "peakdetect_spline_analytic"
+    kwargs = {"mode": "analytic"}
+
+    def __init__(self, *args, **kwargs):
+        super(Test_peakdetect_spline_analytic, self).__init__(*args, **kwargs)
+        self.func = peakdetect.peakdetect_spline
+            
+        
 class Test_peakdetect_zero_crossing(TestPeakdetectTemplate):
     name = "peakdetect_zero_crossing"
 
@@ -571,18 +1157,6 @@ class Test_peakdetect_zero_crossing(TestPeakdetectTemplate):
 
         
 class Test_peakdetect_misc(unittest.TestCase):
-    def test__pad(self):
-        data = [1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1]
-        pad_len = 2
-        pad = lambda x, c: x[:len(x) // 2] + [0] * c + x[len(x) // 2:]
-        expected = pad(list(data), 2 **
-                       peakdetect._n(len(data) * pad_len) - len(data))
-        received = peakdetect._pad(data, pad_len)
-        
-        self.assertListEqual(received, expected)
-    def test__n(self):
-        self.assertEqual(2**peakdetect._n(1000), 1024)
-        
     def test_zero_crossings(self):
         y = waveform.ACV_A1(linspace_peakdetect)
         expected_indice = [1000, 2000, 3000, 4000, 5000, 6000, 7000, 8000, 9000]
@@ -591,18 +1165,305 @@ class Test_peakdetect_misc(unittest.TestCase):
         for rec, exp in zip(indice, expected_indice):
             self.assertAlmostEqual(rec, exp, delta=1, msg=msg.format(rec, exp))
 
+    def test__smooth(self):
+        # compare with a direct convolution of the reflect padded signal
+        x = prng().normal(0, 1, 3000)
+        for window_len, window in [(11, "hanning"), (31, "flat"),
+                                   (301, "blackman"), (301, "flat")]:
+            w = {"flat": np.ones, "hanning": np.hanning,
+                 "blackman": np.blackman}[window](window_len)
+            s = np.r_[x[window_len-1:0:-1], x, x[-1:-window_len:-1]]
+            expected = np.convolve(w / w.sum(), s, mode="valid")
+            received = _peakdetect._smooth(x, window_len, window)
+            self.assertTrue(np.allclose(received, expected, atol=1e-12))
+            received = _peakdetect._smooth(np.array([x, -x]), window_len,
+                                           window)
+            self.assertTrue(np.allclose(received, [expected, -expected],
+                                        atol=1e-12))
+        self.assertIs(_peakdetect._smooth_window("hanning", 11),
+                      _peakdetect._smooth_window("hanning", 11))
+        with self.assertRaises(ValueError):
+            _peakdetect._smooth(x, 11, "gauss")
+
+    def test_parabola_fitter(self):
+        # compare the closed form fit with an iterative least squares fit
+        from scipy.optimize import curve_fit
+        func = lambda x, a, tau, c: a * ((x - tau) ** 2) + c
+        x = linspace_peakdetect
+        y = waveform.ACV_A3(x) + prng().normal(0, 0.5, len(x))
+        max_raw, min_raw = peakdetect.peakdetect_zero_crossing(
+            y, output="array")
+        index = np.sort(np.r_[max_raw["index"], min_raw["index"]])
+        tau, c, a = _peakdetect._peakdetect_parabola_fitter(index, x, y, 31)
+        # first approximation as in the original per peak fit
+        distance = abs(x[index[1]] - x[index[0]]) / 4
+        for i, peak in enumerate(index):
+            p0 = (-np.sign(y[peak]) * abs(y[peak]) / distance ** 2,
+                  x[peak], y[peak])
+            popt, pcov = curve_fit(func, x[peak - 15:peak + 16],
+                                   y[peak - 15:peak + 16], p0)
+            # curve_fit stops iterating within its tolerance of the optimum
+            self.assertTrue(np.allclose(popt, [a[i], tau[i], c[i]],
+                                        rtol=1e-5, atol=1e-9))
+
+    def test_sine_fit(self):
+        y = waveform.ACV_A1(linspace_peakdetect)
+        y_copy = y.copy()
+        for lock_frequency in [False, True]:
+            max_peaks, min_peaks = peakdetect.peakdetect_sine(
+                y, linspace_peakdetect, lock_frequency=lock_frequency,
+                output="array")
+            # the input is left untouched and the frequency is in x units
+            self.assertTrue(np.array_equal(y, y_copy))
+            self.assertTrue(np.allclose(max_peaks["Hz"], 50, rtol=1e-3))
+            self.assertTrue(np.allclose(min_peaks["Hz"], 50, rtol=1e-3))
+
+    def test_zero_crossings_sine_fit(self):
+        # a sine with offset and drift, crossings are known analytically
+        x = linspace_peakdetect
+        y = 3 * np.sin(2 * np.pi * 50 * x + 0.3) + 0.2 + 5 * x
+        expected = (np.arange(1, 11) * np.pi - 0.3) / (2 * np.pi * 50)
+        received = peakdetect.zero_crossings_sine_fit(y, x)
+        self.assertEqual(len(received), len(expected))
+        self.assertTrue(np.allclose(received, expected, rtol=0, atol=1e-7))
+        received = peakdetect.zero_crossings_sine_fit(np.array([y, -y]), x)
+        self.assertTrue(np.allclose(received, [expected, expected],
+                                    rtol=0, atol=1e-7))
+
+    def test_sine_fit_noisy(self):
+        # diverging fits used to put peaks periods away from the raw peak
+        x = linspace_peakdetect
+        for seed in [0, 3, 4, 5]:
+            for acv in [waveform.ACV_A1, waveform.ACV_A3, waveform.ACV_A5]:
+                y = acv(x) + np.random.RandomState(seed).normal(0, 20, len(x))
+                raw = peakdetect.peakdetect_zero_crossing(y, x, output="array")
+                for func in [peakdetect.peakdetect_sine,
+                             peakdetect.peakdetect_sine_locked]:
+                    fitted = func(y, x, output="array")
+                    for r, f in zip(raw, fitted):
+                        # a tenth of the 20 ms period
+                        self.assertTrue(np.all(np.abs(f["x"] - r["x"]) <
+                                               0.002))
+                        self.assertTrue(np.all(np.abs(f["y"]) < 2000))
+                crossings = peakdetect.zero_crossings_sine_fit(y, x)
+                self.assertTrue(np.allclose(np.diff(crossings), 0.01,
+                                            atol=0.001))
+        # the fit is closer to the true vertex than the raw peak, also where
+        # the vertex lies outside the window of the fit
+        errors = {"raw": [], "fitted": []}
+        for seed in range(10):
+            y = (waveform.ACV_A1(x) +
+                 np.random.RandomState(seed).normal(0, 5, len(x)))
+            raw = peakdetect.peakdetect_zero_crossing(y, x, output="array")
+            fitted = peakdetect.peakdetect_sine_locked(y, x, output="array")
+            for vertex, r, f in zip([0.005, 0.015], raw, fitted):
+                for key, peaks in [("raw", r), ("fitted", f)]:
+                    errors[key].extend(np.abs((peaks["x"] - vertex + 0.01) %
+                                              0.02 - 0.01))
+        dx = x[1] - x[0]
+        self.assertLess(np.mean(errors["fitted"]),
+                        0.7 * np.mean(errors["raw"]))
+        self.assertLess(np.max(errors["fitted"]), 20 * dx)
+        self.assertGreater(np.max(errors["raw"]), 25 * dx)
+        # the mask of '_gauss_newton' tells the windows that didn't converge
+        t = np.linspace(-1, 1, 21)[np.newaxis]
+        p, converged = _peakdetect._gauss_newton(
+            lambda x, p: p[:, :1] * x, lambda x, p: x[..., np.newaxis],
+            t, 3 * t, [[1.0]], iterations=1)
+        self.assertFalse(converged[0])
+        p, converged = _peakdetect._gauss_newton(
+            lambda x, p: p[:, :1] * x, lambda x, p: x[..., np.newaxis],
+            t, 3 * t, [[1.0]])
+        self.assertTrue(converged[0])
+        self.assertAlmostEqual(p[0, 0], 3)
+
+    def test_return_fit(self):
+        x = linspace_peakdetect
+        y = waveform.ACV_A1(x)
+        for func in [peakdetect.peakdetect_parabola,
+                     peakdetect.peakdetect_sine]:
+            max_peaks, min_peaks, max_fitted, min_fitted = func(
+                y, x, return_fit=True)
+            self.assertEqual(func(y, x), [max_peaks, min_peaks])
+            self.assertEqual(len(max_fitted), len(max_peaks))
+            for peak, (x2, y2) in zip(max_peaks, max_fitted):
+                self.assertEqual(len(x2), 310)
+                # the vertex is the top of the fitted curve
+                self.assertTrue(x2[0] <= peak[0] <= x2[-1])
+                self.assertTrue(np.all(y2 <= peak[1] + 1e-9))
+            fitted = func(np.array([y, -y]), x, output="array",
+                          return_fit=True)
+            self.assertEqual(fitted[2][0].shape, (len(fitted[0]), 310))
+
+    def test_peakdetect_fft_workers(self):
+        y = waveform.ACV_A1(linspace_peakdetect)
+        expected = peakdetect.peakdetect_fft(y, linspace_peakdetect)
+        received = peakdetect.peakdetect_fft(y, linspace_peakdetect,
+                                             workers=2)
+        self.assertTrue(np.allclose(received, expected, rtol=1e-12))
+
+    def test_peakdetect_fft_mode(self):
+        with self.assertRaises(ValueError):
+            peakdetect.peakdetect_fft(waveform.ACV_A1(linspace_peakdetect),
+                                      linspace_peakdetect, mode="sinc")
+
+    def test_spline_extrema(self):
+        # the analytic extrema are the top of the densely evaluated spline
+        from scipy.signal import cspline1d, cspline1d_eval
+        y = (np.sin(np.linspace(0, 40, 400)) +
+             prng().normal(0, 0.02, 400))
+        max_peaks, min_peaks = peakdetect.peakdetect_spline(
+            y, np.arange(400.0), mode="analytic")
+        cj = cspline1d(y)
+        for x, peak in max_peaks:
+            dense = cspline1d_eval(cj, np.linspace(x - 1.5, x + 1.5, 3001))
+            self.assertTrue(peak >= dense.max() - 1e-12)
+        for x, peak in min_peaks:
+            dense = cspline1d_eval(cj, np.linspace(x - 1.5, x + 1.5, 3001))
+            self.assertTrue(peak <= dense.min() + 1e-12)
+        with self.assertRaises(ValueError):
+            peakdetect.peakdetect_spline(y, np.arange(400.0), mode="exact")
+
+    def test_datacheck(self):
+        # the samples are neither copied nor converted, the index axis is
+        # never built
+        y = np.sin(np.linspace(0, 50, 10000)).astype(np.float32)
+        x_axis, y_axis = _peakdetect._datacheck_peakdetect(None, y)
+        self.assertIs(y_axis, y)
+        self.assertNotIsInstance(x_axis, np.ndarray)
+        np.testing.assert_array_equal(x_axis[[3, -1]], [3, 9999])
+        np.testing.assert_array_equal(x_axis[2:9:3], [2, 5, 8])
+        np.testing.assert_array_equal(x_axis.searchsorted([-1, 2.5, 9999]),
+                                      [0, 3, 9999])
+        self.assertRaises(IndexError, x_axis.__getitem__, 10000)
+        x_axis, y_axis = _peakdetect._datacheck_peakdetect(None, y,
+                                                           dtype=np.float64)
+        self.assertEqual(y_axis.dtype, np.float64)
+
+        max_peaks, min_peaks = peakdetect.peakdetect(y, lookahead=50,
+                                                     output="array")
+        self.assertEqual(max_peaks["y"].dtype, np.float32)
+        expected = peakdetect.peakdetect(y, np.arange(len(y)), lookahead=50)
+        self.assertEqual(peakdetect.peakdetect(y, lookahead=50), expected)
+
+    def test_profile(self):
+        import tracemalloc
+        y = waveform.ACV_A1(linspace_peakdetect)
+        with peakdetect.Profile() as profile:
+            peakdetect.peakdetect_parabola(y, linspace_peakdetect)
+            peakdetect.peakdetect(y, lookahead=100, backend="numpy")
+        self.assertIsNone(_peakdetect._PROFILER)
+        self.assertFalse(tracemalloc.is_tracing())
+        stages = profile.stages
+        for stage in ["peakdetect_parabola", "peakdetect_zero_crossing",
+                      "zero_crossings", "smooth", "zero_crossing_bins",
+                      "parabola_fit", "peakdetect", "sliding_extreme",
+                      "peakdetect_scan"]:
+            self.assertIn(stage, stages)
+            self.assertGreater(stages[stage]["wall_time"], 0)
+        self.assertEqual(stages["peakdetect_parabola"]["calls"], 1)
+        self.assertEqual(stages["parabola_fit"]["calls"], 2)
+        self.assertEqual(stages["smooth"]["samples"], len(y))
+        self.assertEqual(stages["sliding_extreme"]["samples"], 2 * len(y))
+        # the smoothed signal is at least as large as the signal
+        self.assertGreaterEqual(stages["smooth"]["peak_bytes"], y.nbytes)
+        report = profile.report()
+        self.assertEqual(sorted(r["wall_time"] for r in report)[::-1],
+                         [r["wall_time"] for r in report])
+        self.assertIn("parabola_fit", str(profile))
+
+        with peakdetect.Profile(memory=False) as profile:
+            peakdetect.peakdetect_zero_crossing(y)
+        self.assertEqual(profile.stages["smooth"]["peak_bytes"], 0)
+
+    def test_uniform_axis(self):
+        # dx and sample_rate give the same peaks as the equivalent x_axis
+        x0, rate = 0.25, 10000.0
+        x = x0 + np.arange(10000) / rate
+        y = np.sin(2 * np.pi * 50 * x) + 0.1 * np.sin(2 * np.pi * 150 * x)
+        detectors = [
+            (peakdetect.peakdetect, {"lookahead": 50}),
+            (peakdetect.peakdetect_zero_crossing, {}),
+            (peakdetect.peakdetect_parabola, {}),
+            (peakdetect.peakdetect_sine, {}),
+            (peakdetect.peakdetect_fft, {}),
+            (peakdetect.peakdetect_fft, {"mode": "local"}),
+            (peakdetect.peakdetect_spline, {}),
+            (peakdetect.peakdetect_spline, {"mode": "analytic"})
+            ]
+        for func, kwargs in detectors:
+            expected = func(y, x, output="array", **kwargs)
+            received = func(y, output="array", x0=x0, sample_rate=rate,
+                            **kwargs)
+            for r, e in zip(received, expected):
+                np.testing.assert_array_equal(r["index"], e["index"])
+                np.testing.assert_allclose(r["x"], e["x"], rtol=1e-12)
+                np.testing.assert_allclose(r["y"], e["y"], rtol=1e-9)
+        np.testing.assert_allclose(
+            peakdetect.zero_crossings_sine_fit(y, x0=x0, dx=1 / rate),
+            peakdetect.zero_crossings_sine_fit(y, x), rtol=1e-12)
+
+        # the fitting detectors need real x values
+        for func in [peakdetect.peakdetect_parabola, peakdetect.peakdetect_sine,
+                     peakdetect.peakdetect_sine_locked,
+                     peakdetect.peakdetect_spline, peakdetect.peakdetect_fft]:
+            self.assertRaises(ValueError, func, y)
+        # without any x the index of the samples is used
+        np.testing.assert_array_equal(
+            peakdetect.zero_crossings_sine_fit(y),
+            peakdetect.zero_crossings_sine_fit(y, np.arange(len(y))))
+        self.assertRaises(ValueError, peakdetect.peakdetect, y, x, dx=0.1)
+        self.assertRaises(ValueError, peakdetect.peakdetect, y, dx=0.1,
+                          sample_rate=rate)
+
+    def test_zero_crossing_bins(self):
+        # compare the segment reduction with an argmax/argmin of every bin
+        rng = prng()
+        y = np.round(np.array([np.sin(np.linspace(0, 60 + c, 3000) + c) +
+                               rng.normal(0, 0.05, 3000)
+                               for c in range(3)]), 1)
+        zero_indices = [np.sort(rng.choice(3000, 40 + c, replace=False))
+                        for c in range(3)]
+        channel, index, is_max = _peakdetect._peakdetect_zero_crossing(
+            y, zero_indices)
+        for c, indices in enumerate(zero_indices):
+            bins = [y[c, start:stop] for start, stop in
+                    zip(indices[:-1], indices[1:])]
+            even_max = abs(bins[0].max()) > abs(bins[0].min())
+            expected = [start + (bin.argmax() if (i % 2 == 0) == even_max
+                                 else bin.argmin())
+                        for i, (start, bin) in enumerate(zip(indices, bins))]
+            self.assertListEqual(list(index[channel == c]), expected)
+            self.assertEqual(is_max[channel == c][0], even_max)
+
 
 if __name__ == "__main__":
     tests_to_run = [
                 # Test_analytic_wfm,
                 Test_peakdetect,
+                Test_peakdetect_engines,
+                Test_PeakDetector,
+                Test_ZeroCrossingTracker,
+                Test_batch,
+                Test_workers,
+                Test_backend,
+                Test_peakdetect_file,
+                Test_multi_channel,
+                Test_array_output,
                 Test_peakdetect_parabola,
                 Test_peakdetect_fft,
-                # Test_peakdetect_sine,  #sine tests disabled pending rework
-                # Test_peakdetect_sine_locked,
+                Test_peakdetect_fft_local,
+                Test_peakdetect_sine,
+                # Test_peakdetect_sine_locked,  #the locked fundamental can't
+                #   follow the overtones of ACV3-ACV6
                 Test_peakdetect_spline,
+                Test_peakdetect_spline_analytic,
                 Test_peakdetect_zero_crossing,
-                Test_peakdetect_misc
+                Test_peakdetect_misc,
+                Test_benchmark,
+                Test_iter_waveform,
+                Test_soak,
+                Test_imports
                 ]
     
     suites_list = [unittest.TestLoader().loadTestsFromTestCase(test_class) for test_class in tests_to_run]
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 from math import pi, sqrt
+import os
+import tempfile
 import numpy as np
 
 __all__ = [
@@ -11,12 +13,40 @@ __all__ = [
         'ACV_A5',
         'ACV_A6',
         'ACV_A7',
-        'ACV_A8'
+        'ACV_A8',
+        'iter_waveform'
         ]
 
 # Heavy-side step function
 H_num = lambda t: 1 if t > 0 else 0
-H = lambda T: np.asarray([1 if t > 0 else 0 for t in T])
+H = lambda T: (np.asarray(T) > 0).astype(int)
+
+
+def _harmonics(T, Hz, overtones):
+    """
+    Generate a fundamental with overtones, summed in place so that only the
+    phase and a single overtone are held besides the result
+    
+    keyword arguments:
+    T -- time points to generate the waveform given in seconds
+    Hz -- The frequency of the fundamental
+    overtones -- list of (multiple of Hz, relative amplitude, phase)
+    """
+    ampl = 1000
+    T = np.asarray(T, dtype=np.float64)
+    if T.ndim == 0:
+        return _harmonics(T[np.newaxis], Hz, overtones)[0]
+    phase = 2*pi*Hz * T
+    wave = np.sin(phase)
+    for multiple, amplitude, shift in overtones:
+        overtone = phase * multiple
+        if shift:
+            overtone += shift
+        np.sin(overtone, out=overtone)
+        overtone *= amplitude
+        wave += overtone
+    wave *= ampl * sqrt(2)
+    return wave
 
 
 # pure sine
@@ -55,11 +85,7 @@ def ACV_A3(T, Hz=50):
     T -- time points to generate the waveform given in seconds
     Hz -- The desired frequency of the signal (default:50)
     """
-    ampl = 1000
-    T = np.asarray(T, dtype=np.float64)
-    main_wave = np.sin(2*pi*Hz * T)
-    harmonic_wave = 0.05 * np.sin(2*pi*Hz * T * 4 + pi * 2 / 3)
-    return ampl * sqrt(2) * (main_wave + harmonic_wave)
+    return _harmonics(T, Hz, [(4, 0.05, pi * 2 / 3)])
 
     
 def ACV_A4(T, Hz=50):
@@ -70,11 +96,7 @@ def ACV_A4(T, Hz=50):
     T -- time points to generate the waveform given in seconds
     Hz -- The desired frequency of the signal (default:50)
     """
-    ampl = 1000
-    T = np.asarray(T, dtype=np.float64)
-    main_wave = np.sin(2*pi*Hz * T)
-    harmonic_wave = 0.07 * np.sin(2*pi*Hz * T * 5 + pi * 22 / 18)
-    return ampl * sqrt(2) * (main_wave + harmonic_wave)
+    return _harmonics(T, Hz, [(5, 0.07, pi * 22 / 18)])
     
     
 def ACV_A5(T, Hz=50):
@@ -85,14 +107,8 @@ def ACV_A5(T, Hz=50):
     T -- time points to generate the waveform given in seconds
     Hz -- The desired frequency of the signal (default:50)
     """
-    ampl = 1000
-    T = np.asarray(T, dtype=np.float64)
-    wave_1 = np.sin(2*pi*Hz * T)
-    wave_2 = 0.05 * np.sin(2*pi*Hz * T * 3 - pi)
-    wave_3 = 0.05 * np.sin(2*pi*Hz * T * 5)
-    wave_4 = 0.02 * np.sin(2*pi*Hz * T * 7 - pi)
-    wave_5 = 0.01 * np.sin(2*pi*Hz * T * 9)
-    return ampl * sqrt(2) * (wave_1 + wave_2 + wave_3 + wave_4 + wave_5)
+    return _harmonics(T, Hz, [(3, 0.05, -pi), (5, 0.05, 0), (7, 0.02, -pi),
+                              (9, 0.01, 0)])
     
     
 def ACV_A6(T, Hz=50):
@@ -103,14 +119,8 @@ def ACV_A6(T, Hz=50):
     T -- time points to generate the waveform given in seconds
     Hz -- The desired frequency of the signal (default:50)
     """
-    ampl = 1000
-    T = np.asarray(T, dtype=np.float64)
-    wave_1 = np.sin(2*pi*Hz * T)
-    wave_2 = 0.02 * np.sin(2*pi*Hz * T * 3 - pi)
-    wave_3 = 0.02 * np.sin(2*pi*Hz * T * 5)
-    wave_4 = 0.0015 * np.sin(2*pi*Hz * T * 7 - pi)
-    wave_5 = 0.009 * np.sin(2*pi*Hz * T * 9)
-    return ampl * sqrt(2) * (wave_1 + wave_2 + wave_3 + wave_4 + wave_5)
+    return _harmonics(T, Hz, [(3, 0.02, -pi), (5, 0.02, 0),
+                              (7, 0.0015, -pi), (9, 0.009, 0)])
     
     
 def ACV_A7(T, Hz=50):
@@ -150,6 +160,78 @@ def ACV_A8(T, Hz=50):
     wave_main = np.sin(T)
     step_func = T / (10 * pi) * H(10 - T / (2*pi*Hz))
     return ampl * sqrt(2) * wave_main * step_func
+
+
+def iter_waveform(name, n, sample_rate, chunk=1 << 20, Hz=50, cache=None):
+    """
+    Generate n samples of one of the waveforms in blocks, so that signals
+    larger than memory can be fed to the detectors. The blocks are the same
+    as slices of the waveform generated at once.
+    
+    keyword arguments:
+    name -- the name of the waveform, e.g. 'ACV_A1'
+    n -- the amount of samples to generate
+    sample_rate -- the sample rate in Hz, sample i is at time i / sample_rate
+    chunk -- the amount of samples of every block (default: 1 << 20)
+    Hz -- The desired frequency of the signal (default:50)
+    cache -- a directory that the signal is saved to as a .npy file while it
+        is generated, and read back from when it already is (default: None)
+    
+    return: a generator of 1-D float64 arrays of up to 'chunk' samples
+    """
+    if name not in __all__ or not name.startswith('ACV_'):
+        raise ValueError("unknown waveform '{0}'".format(name))
+    if chunk < 1:
+        raise ValueError("chunk must be at least 1")
+    func = globals()[name]
+    path = None
+    if cache is not None:
+        path = os.path.join(cache, "{0}_{1}_{2}_{3}.npy".format(
+            name, n, sample_rate, Hz))
+        if os.path.exists(path):
+            return _iter_saved(path, chunk)
+    return _iter_generated(func, n, sample_rate, chunk, Hz, path)
+
+
+def _iter_generated(func, n, sample_rate, chunk, Hz, path):
+    """
+    Generator of 'iter_waveform' computing the blocks, which are also
+    written to 'path' unless it is None. The file is only put in place when
+    every block has been generated.
+    """
+    out = None
+    if path is not None:
+        # a unique name per generator, as several may fill the cache at once
+        fd, temp = tempfile.mkstemp(".tmp", os.path.basename(path),
+                                    os.path.dirname(path))
+        os.close(fd)
+        out = np.lib.format.open_memmap(temp, mode="w+", dtype=np.float64,
+                                        shape=(n,))
+    try:
+        for start in range(0, n, chunk):
+            stop = min(start + chunk, n)
+            block = func(np.arange(start, stop) / sample_rate, Hz)
+            if out is not None:
+                out[start:stop] = block
+            yield block
+        if out is not None:
+            out.flush()
+            del out
+            out = None
+            os.replace(temp, path)
+    finally:
+        if out is not None:
+            del out
+            os.remove(temp)
+
+
+def _iter_saved(path, chunk):
+    """
+    Generator of 'iter_waveform' reading the blocks of a cached signal
+    """
+    saved = np.load(path, mmap_mode="r")
+    for start in range(0, len(saved), chunk):
+        yield np.array(saved[start:start + chunk])
     
  
 _ACV_A1_L = lambda T, Hz = 50: 1000 * sqrt(2) * np.sin(2*pi*Hz * T)